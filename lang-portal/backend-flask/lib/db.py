@@ -59,6 +59,9 @@ class Db:
     cursor.execute(self.sql('setup/create_table_study_sessions.sql'))
     self.get().commit()
 
+    cursor.executescript(self.sql('setup/create_index_words_sort.sql'))
+    self.get().commit()
+
   def import_study_activities_json(self,cursor,data_json_path):
     study_actvities = self.load_json(data_json_path)
     for activity in study_actvities:
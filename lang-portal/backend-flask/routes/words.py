@@ -2,6 +2,15 @@ from flask import request, jsonify, g
 from flask_cors import cross_origin
 import json
 
+# SQL expression behind each sortable column, used for keyset pagination
+SORT_EXPRESSIONS = {
+    'kanji': 'w.kanji',
+    'romaji': 'w.romaji',
+    'english': 'w.english',
+    'correct_count': 'COALESCE(r.correct_count, 0)',
+    'wrong_count': 'COALESCE(r.wrong_count, 0)'
+}
+
 def load(app):
     def handle_db_error(e):
         if not hasattr(app, 'db') or app.db is None:
@@ -24,6 +33,9 @@ def load(app):
             try:
                 page = int(request.args.get('page', 1))
                 per_page = int(request.args.get('per_page', 50))
+                # Cursor: id of the last word on the previous page
+                after = request.args.get('after')
+                after = int(after) if after is not None else None
             except ValueError:
                 return jsonify({"error": "Invalid pagination parameters"}), 400
             
@@ -46,16 +58,38 @@ def load(app):
             if order not in ['asc', 'desc']:
                 return jsonify({"error": "Invalid order parameter"}), 400
 
-            # Query to fetch words with sorting
-            cursor.execute(f'''
-                SELECT w.id, w.kanji, w.romaji, w.english, 
-                    COALESCE(r.correct_count, 0) AS correct_count,
-                    COALESCE(r.wrong_count, 0) AS wrong_count
-                FROM words w
-                LEFT JOIN word_reviews r ON w.id = r.word_id
-                ORDER BY {sort_by} {order}
-                LIMIT ? OFFSET ?
-            ''', (per_page, offset))
+            sort_expr = SORT_EXPRESSIONS[sort_by]
+
+            if after is not None:
+                # Keyset pagination: seek past the (sort value, id) of the cursor word
+                # instead of scanning and discarding OFFSET rows
+                comparison = '>' if order == 'asc' else '<'
+                cursor.execute(f'''
+                    SELECT w.id, w.kanji, w.romaji, w.english, 
+                        COALESCE(r.correct_count, 0) AS correct_count,
+                        COALESCE(r.wrong_count, 0) AS wrong_count
+                    FROM words w
+                    LEFT JOIN word_reviews r ON w.id = r.word_id
+                    WHERE ({sort_expr}, w.id) {comparison} (
+                        SELECT {sort_expr}, w.id
+                        FROM words w
+                        LEFT JOIN word_reviews r ON w.id = r.word_id
+                        WHERE w.id = ?
+                    )
+                    ORDER BY {sort_expr} {order}, w.id {order}
+                    LIMIT ?
+                ''', (after, per_page))
+            else:
+                # Query to fetch words with sorting
+                cursor.execute(f'''
+                    SELECT w.id, w.kanji, w.romaji, w.english, 
+                        COALESCE(r.correct_count, 0) AS correct_count,
+                        COALESCE(r.wrong_count, 0) AS wrong_count
+                    FROM words w
+                    LEFT JOIN word_reviews r ON w.id = r.word_id
+                    ORDER BY {sort_expr} {order}, w.id {order}
+                    LIMIT ? OFFSET ?
+                ''', (per_page, offset))
 
             words = cursor.fetchall()
 
@@ -79,8 +113,10 @@ def load(app):
             return jsonify({
                 "words": words_data,
                 "total_pages": total_pages,
-                "current_page": page,
-                "total_words": total_words
+                "current_page": page if after is None else None,
+                "total_words": total_words,
+                # Pass back as `after` to fetch the next page
+                "next_cursor": words_data[-1]["id"] if len(words_data) == per_page else None
             })
 
         except Exception as e:
@@ -96,18 +132,21 @@ def load(app):
         try:
             cursor = app.db.cursor()
             
-            # Query to fetch the word and its details
+            # Query to fetch the word and its details, with its groups aggregated
+            # into a JSON array in the same round-trip
             cursor.execute('''
                 SELECT w.id, w.kanji, w.romaji, w.english,
                        COALESCE(r.correct_count, 0) AS correct_count,
                        COALESCE(r.wrong_count, 0) AS wrong_count,
-                       GROUP_CONCAT(DISTINCT g.id || '::' || g.name) as groups
+                       (
+                           SELECT json_group_array(json_object('id', g.id, 'name', g.name))
+                           FROM word_groups wg
+                           JOIN groups g ON wg.group_id = g.id
+                           WHERE wg.word_id = w.id
+                       ) AS groups_json
                 FROM words w
                 LEFT JOIN word_reviews r ON w.id = r.word_id
-                LEFT JOIN word_groups wg ON w.id = wg.word_id
-                LEFT JOIN groups g ON wg.group_id = g.id
                 WHERE w.id = ?
-                GROUP BY w.id
             ''', (word_id,))
             
             word = cursor.fetchone()
@@ -115,15 +154,7 @@ def load(app):
             if not word:
                 return jsonify({"error": "Word not found"}), 404
             
-            # Parse the groups string into a list of group objects
-            groups = []
-            if word["groups"]:
-                for group_str in word["groups"].split(','):
-                    group_id, group_name = group_str.split('::')
-                    groups.append({
-                        "id": int(group_id),
-                        "name": group_name
-                    })
+            groups = json.loads(word["groups_json"])
             
             return jsonify({
                 "word": {
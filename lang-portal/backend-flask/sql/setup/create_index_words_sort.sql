@@ -0,0 +1,5 @@
+-- Composite (sort column, id) indexes so keyset pagination on /api/words can seek
+CREATE INDEX IF NOT EXISTS idx_words_kanji_id ON words(kanji, id);
+CREATE INDEX IF NOT EXISTS idx_words_romaji_id ON words(romaji, id);
+CREATE INDEX IF NOT EXISTS idx_words_english_id ON words(english, id);
+CREATE INDEX IF NOT EXISTS idx_word_reviews_word_id ON word_reviews(word_id);
@@ -111,6 +111,32 @@ def test_sorting_edge_cases(client):
             response = client.get(f'/words?sort_by={field}&order={order}')
             assert response.status_code == 200 
 
+def test_get_words_cursor_pagination(client):
+    # Walk every word two at a time using the cursor
+    seen = []
+    after = None
+    while True:
+        url = '/api/words?per_page=2&sort_by=romaji'
+        if after is not None:
+            url += f'&after={after}'
+        response = client.get(url)
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        seen.extend(word['romaji'] for word in data['words'])
+        after = data['next_cursor']
+        if after is None:
+            break
+    assert seen == ['hajimeru', 'hashiru', 'owaru', 'taberu']
+    
+    # Test cursor past the last word
+    response = client.get('/api/words?after=1&sort_by=kanji&order=desc')
+    assert response.status_code == 200
+    assert json.loads(response.data)['words'] == []
+    
+    # Test invalid cursor
+    response = client.get('/api/words?after=abc')
+    assert response.status_code == 400
+
 def test_word_review_counts(client):
     # Create a study session
     session_data = {
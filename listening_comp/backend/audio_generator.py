@@ -1,13 +1,71 @@
 import os
 import boto3
-import subprocess
+import contextlib
+import hashlib
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# Upper bound on simultaneous Polly requests, to stay within the account's TPS quota
+MAX_POLLY_CONCURRENCY = 8
+
+# MPEG Layer III bitrates (kbps) by bitrate index, for MPEG-1 and for MPEG-2/2.5
+_MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Sample rates by version bits (0: MPEG-2.5, 2: MPEG-2, 3: MPEG-1) and sample rate index
+_MP3_SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+
+def _mp3_header_sizes(src):
+    """Return the sizes of an MP3 file's leading ID3v2 tag and Xing/Info frame (0 when absent).
+
+    Leaves the file positioned at the start.
+    """
+    head = src.read(10)
+    tag_size = 0
+    if len(head) == 10 and head[:3] == b'ID3':
+        # Syncsafe size: 7 bits per byte, plus the header and an optional footer
+        tag_size = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+        if head[5] & 0x10:
+            tag_size += 10
+    src.seek(tag_size)
+    frame = src.read(40)
+    src.seek(0)
+
+    info_size = 0
+    if len(frame) >= 4 and frame[0] == 0xFF and frame[1] & 0xE0 == 0xE0 and (frame[1] >> 1) & 0x3 == 1:
+        version = (frame[1] >> 3) & 0x3
+        bitrate_index = frame[2] >> 4
+        rate_index = (frame[2] >> 2) & 0x3
+        if version in _MP3_SAMPLE_RATES and 0 < bitrate_index < 15 and rate_index < 3:
+            mono = frame[3] >> 6 == 3
+            if version == 3:
+                side_info = 17 if mono else 32
+                samples_factor = 144
+            else:
+                side_info = 9 if mono else 17
+                samples_factor = 72
+            if frame[4 + side_info:8 + side_info] in (b'Xing', b'Info'):
+                bitrate = _MP3_BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+                padding = (frame[2] >> 1) & 0x1
+                info_size = samples_factor * bitrate // _MP3_SAMPLE_RATES[version][rate_index] + padding
+    return tag_size, info_size
+
 class AudioGenerator:
     def __init__(self):
         self.polly = boto3.client('polly')
         self.audio_dir = os.path.join(os.path.dirname(__file__), "data", "audio")
         os.makedirs(self.audio_dir, exist_ok=True)
+        # Content-addressed cache of synthesized segments, keyed by (voice, language, engine, text)
+        self.cache_dir = os.path.join(self.audio_dir, "cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._polly_slots = threading.Semaphore(MAX_POLLY_CONCURRENCY)
+        # Precomputed path template for the combined output
+        self._out_tpl = os.path.join(self.audio_dir, 'question_{qid}.mp3')
+        self.separator_path = os.path.join(self.audio_dir, 'util', 'separator_sound.mp3')
         
         # Updated voice mapping with distinct voices
         self.voices = {
@@ -17,90 +75,139 @@ class AudioGenerator:
         }
 
     def _generate_audio_segment(self, text, voice, output_path):
-        response = self.polly.synthesize_speech(
-            Text=text,
-            OutputFormat='mp3',
-            VoiceId=voice,
-            LanguageCode='ja-JP',
-            Engine='neural'  # Explicitly specify neural engine
-        )
-        with open(output_path, 'wb') as file:
-            file.write(response['AudioStream'].read())
+        key = hashlib.sha256(f"{voice}|ja-JP|neural|{text}".encode('utf-8')).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"{key}.mp3")
 
-    def _combine_audio_files(self, files, output_path):
-        # Create a temporary file with list of files to combine
-        list_file = os.path.join(self.audio_dir, 'filelist.txt')
-        separator_path = os.path.join(self.audio_dir, 'util', 'separator_sound.mp3')
-        
-        with open(list_file, 'w') as f:
-            for i, file in enumerate(files):
-                f.write(f"file '{file}'\n")
-                # Add separator sound after introduction and conversation
-                if i < len(files) - 1:  # Add separator between segments
-                    f.write(f"file '{separator_path}'\n")
-        
-        # Use ffmpeg to combine audio files into an MP3
-        subprocess.run([
-            'ffmpeg',
-            '-f', 'concat',
-            '-safe', '0',
-            '-i', list_file,
-            '-c:a', 'libmp3lame',  # Use libmp3lame codec for MP3
-            '-b:a', '192k',  # Set bitrate
-            output_path.replace('.mpeg', '.mp3')  # Change extension to .mp3
-        ])
-        
-        # Clean up temporary files
-        os.remove(list_file)
-        for file in files:
-            os.remove(file)
+        # Identical segments are reused from disk instead of calling Polly again
+        if not os.path.exists(cache_path):
+            # Write to a temporary file first so a failed download never leaves a partial cache entry
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with self._polly_slots:
+                    response = self.polly.synthesize_speech(
+                        Text=text,
+                        OutputFormat='mp3',
+                        VoiceId=voice,
+                        LanguageCode='ja-JP',
+                        Engine='neural'  # Explicitly specify neural engine
+                    )
+                    # Stream the body straight to disk and release the connection back to the pool
+                    with contextlib.closing(response['AudioStream']) as stream, open(tmp_path, 'wb') as file:
+                        shutil.copyfileobj(stream, file, 64 * 1024)
+                os.replace(tmp_path, cache_path)
+            except BaseException:
+                # Never leave a partial download behind in the cache directory
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(tmp_path)
+                raise
 
-    def generate_question_audio(self, question, question_id):
-        print("\n=== Generate_Question_Audio ===")
-        print(f"Question ID: {question_id}")
-        print(f"Question: {question}")
-        print("===============================\n")
+        # Hardlink the cached segment instead of copying it; the temp file is only read once
         try:
-            # Generate audio segments
-            temp_files = []
-            
+            os.link(cache_path, output_path)
+        except OSError:
+            shutil.copyfile(cache_path, output_path)
+
+    def _combine_audio_files(self, files, output_path):
+        # Polly and the separator sound share the same MP3 profile (24kHz mono),
+        # so the frames can be concatenated directly without re-encoding. Only the first
+        # segment's ID3 tag is kept, and every Xing/Info frame is dropped: it holds one
+        # segment's frame count, which would make players report the wrong duration
+        parts = []
+        for i, file in enumerate(files):
+            parts.append(file)
+            # Add separator sound after introduction and conversation
+            if i < len(files) - 1:  # Add separator between segments
+                parts.append(self.separator_path)
+        with open(output_path.replace('.mpeg', '.mp3'), 'wb') as out:  # Change extension to .mp3
+            for i, part in enumerate(parts):
+                with open(part, 'rb') as src:
+                    tag_size, info_size = _mp3_header_sizes(src)
+                    if i == 0 and tag_size:
+                        out.write(src.read(tag_size))
+                    src.seek(tag_size + info_size)
+                    shutil.copyfileobj(src, out, 64 * 1024)
+
+    def _question_segments(self, question, question_id, temp_dir):
+        """Return the (text, voice, temp file) segments that make up a question's audio"""
+        temp_tpl = os.path.join(temp_dir, 'temp_{kind}_{qid}.mp3')
+        return [
             # 1. Introduction
-            intro_file = os.path.join(self.audio_dir, f'temp_intro_{question_id}.mp3')
-            self._generate_audio_segment(
+            (
                 question['introduction'],
                 self.voices['announcer'],
-                intro_file
-            )
-            temp_files.append(intro_file)
-            
+                temp_tpl.format(kind='intro', qid=question_id)
+            ),
             # 2. Conversation
-            conv_file = os.path.join(self.audio_dir, f'temp_conv_{question_id}.mp3')
-            self._generate_audio_segment(
+            (
                 question['conversation'],
                 self.voices['male'] if '男の人' in question['conversation'] else self.voices['female'],
-                conv_file
-            )
-            temp_files.append(conv_file)
-            
+                temp_tpl.format(kind='conv', qid=question_id)
+            ),
             # 3. Question
-            question_file = os.path.join(self.audio_dir, f'temp_question_{question_id}.mp3')
-            self._generate_audio_segment(
+            (
                 question['question'],
                 self.voices['announcer'],
-                question_file
-            )
-            temp_files.append(question_file)
-            
-            # Combine audio files
-            output_file = os.path.join(self.audio_dir, f'question_{question_id}.mp3')
-            self._combine_audio_files(temp_files, output_file)
+                temp_tpl.format(kind='question', qid=question_id)
+            ),
+        ]
+
+    def generate_question_audio(self, question, question_id):
+        print("\n=== Generate_Question_Audio ===")
+        print(f"Question ID: {question_id}")
+        print(f"Question: {question}")
+        print("===============================\n")
+        try:
+            # Temporary segments live in a scratch directory that is removed even on failure
+            with tempfile.TemporaryDirectory(dir=self.audio_dir) as temp_dir:
+                # Generate audio segments
+                temp_files = []
+                
+                for text, voice, temp_file in self._question_segments(question, question_id, temp_dir):
+                    self._generate_audio_segment(text, voice, temp_file)
+                    temp_files.append(temp_file)
+                
+                # Combine audio files
+                output_file = self._out_tpl.format(qid=question_id)
+                self._combine_audio_files(temp_files, output_file)
             
             return output_file
             
         except Exception as e:
             print(f"Error generating audio: {str(e)}")
-            # Clean up temporary files in case of error
-            for file in temp_files:
-                if os.path.exists(file):
-                    os.remove(file)
-            return None
\ No newline at end of file
+            return None
+
+    def generate_many(self, questions, max_concurrency=MAX_POLLY_CONCURRENCY):
+        """Generate audio for a batch of (question, question_id) pairs.
+
+        Every segment of every question is synthesized concurrently; each question is
+        combined as soon as its own segments are done. Returns {question_id: audio file or None}.
+        """
+        results = {}
+
+        # The executor exits first, so every segment is finished before the scratch directory is removed
+        with tempfile.TemporaryDirectory(dir=self.audio_dir) as temp_dir, \
+                ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            segments = {
+                question_id: self._question_segments(question, question_id, temp_dir)
+                for question, question_id in questions
+            }
+            futures = {
+                question_id: [
+                    executor.submit(self._generate_audio_segment, text, voice, temp_file)
+                    for text, voice, temp_file in question_segments
+                ]
+                for question_id, question_segments in segments.items()
+            }
+
+            for question_id, segment_futures in futures.items():
+                try:
+                    for future in segment_futures:
+                        future.result()
+                    output_file = self._out_tpl.format(qid=question_id)
+                    self._combine_audio_files([temp_file for _, _, temp_file in segments[question_id]], output_file)
+                    results[question_id] = output_file
+                except Exception as e:
+                    print(f"Error generating audio for question {question_id}: {str(e)}")
+                    results[question_id] = None
+
+        return results
@@ -10,8 +10,11 @@ def empty_table():
     try:
         with sqlite3.connect(db_path) as conn:
             cursor = conn.cursor()
+            # DELETE without a WHERE clause lets SQLite use its truncate optimization
             cursor.execute("DELETE FROM questions")
             conn.commit()
+            # Reclaim the freed pages right away instead of leaving them on the freelist
+            cursor.execute("VACUUM")
             print(f"Successfully emptied questions table in {db_path}")
     except sqlite3.Error as e:
         print(f"Error emptying table: {str(e)}")
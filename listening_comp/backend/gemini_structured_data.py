@@ -1,11 +1,18 @@
 import os
 import json
+import functools
 from typing import List, Dict, Any, Optional
 from pprint import pprint  # Import pprint for pretty printing
 
 # Assuming you have a Google Gemini client library installed
 # from google_gemini import GeminiClient  # Uncomment this line if you have a Gemini client
 
+@functools.lru_cache(maxsize=8)
+def _load_prompt_cached(prompt_file: str, mtime: float) -> str:
+    """Read a prompt file once per modification time, shared across extractor instances."""
+    with open(prompt_file, 'r', encoding='utf-8') as file:
+        return file.read()
+
 class GeminiChat:
     def __init__(self):
         """Initialize Google Gemini chat client"""
@@ -25,17 +32,21 @@ class GeminiChat:
             return None
 
 class TranscriptExtractor:
-    def __init__(self, transcript: List[Dict[str, str]], prompt_file: str = 'backend/prompts/claude_json_prompt.md'):
-        """Initialize the TranscriptExtractor with a transcript."""
+    def __init__(self, transcript: List[Dict[str, str]], prompt_file: str = 'backend/prompts/claude_json_prompt.md', parse_enabled: bool = False):
+        """Initialize the TranscriptExtractor with a transcript.
+
+        The model is only called when parse_enabled is True, since the response is
+        otherwise discarded.
+        """
         self.transcript = transcript
+        self.parse_enabled = parse_enabled
         self.gemini_chat = GeminiChat()
         self.prompt = self.load_prompt(prompt_file)
 
     def load_prompt(self, prompt_file: str) -> str:
         """Load the prompt from a file."""
         try:
-            with open(prompt_file, 'r', encoding='utf-8') as file:
-                return file.read()
+            return _load_prompt_cached(prompt_file, os.path.getmtime(prompt_file))
         except Exception as e:
             print(f"Error loading prompt: {str(e)}")
             return ""
@@ -48,19 +59,21 @@ class TranscriptExtractor:
             "question": ""
         }
 
-        # Prepare the full prompt for Gemini
-        full_prompt = self.prompt + "\n" + "Transcript:\n"
+        if not self.parse_enabled:
+            # Skip the model call entirely while response parsing is switched off
+            print("Warning: response parsing is disabled, skipping Gemini call")
+            return structured_data
 
-        # Append the transcript to the prompt
-        for entry in self.transcript:
-            full_prompt += entry['text'] + "\n"
+        # Prepare the full prompt for Gemini, joining the transcript in a single pass
+        body = "\n".join(entry['text'] for entry in self.transcript)
+        full_prompt = f"{self.prompt}\nTranscript:\n{body}\n"
 
         # Generate a response using the prompt
         response = self.gemini_chat.generate_response(full_prompt)
         
-        # if response:
+        if response:
             # Assuming the response is structured in a way that can be parsed
-            # structured_data = self.parse_response(response)
+            structured_data = self.parse_response(response)
 
         return structured_data
 
@@ -1,24 +1,46 @@
 import os
 import json
 import glob
+import orjson
+import fastjsonschema
 import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pprint import pprint  # Import pprint for pretty printing
-from jsonschema import validate, ValidationError
+from typing import List, Optional, Tuple
+
+def _load_questions(path: str) -> list:
+    """Read a JSON run file and return its questions. Runs in a worker process."""
+    with open(path, 'rb') as json_file:
+        return orjson.loads(json_file.read())['questions']
+
+def _process_prefix(directory: str, schema: dict, prefix: str, files: List[str], max_workers: int) -> Tuple[str, bool]:
+    """Merge, validate and save the files for one prefix. Runs in a worker process."""
+    merger = JsonMerger(directory, schema_file=None, max_workers=max_workers)
+    # Compiled validators are not picklable, so each worker compiles its own from the schema dict
+    merger.schema = schema
+    merger._validate = fastjsonschema.compile(schema)
+    merger.merge_json_files(prefix, files)
+    if not merger.validate_json():
+        return prefix, False
+    merger.save_merged_file(prefix)
+    return prefix, True
 
 class JsonMerger:
-    def __init__(self, directory: str, schema_file: str):
+    def __init__(self, directory: str, schema_file: str, max_workers: Optional[int] = None):
         self.directory = directory
         self.schema_file = schema_file
-        self.merged_data = {}
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.merged_records = []
     
     def load_schema(self) -> None:
         with open(self.schema_file, 'r', encoding='utf-8') as schema_file:  # Ensure UTF-8 encoding
             self.schema = json.load(schema_file)
+        # Compile the schema once; validate_json reuses the generated validator
+        self._validate = fastjsonschema.compile(self.schema)
 
-    def merge_json_files(self, prefix: str) -> None:
-        """Merge JSON files with the specified prefix into a single dictionary."""
-        files = glob.glob(os.path.join(self.directory, f"{prefix}*.json"))
-        
+    def merge_json_files(self, prefix: str, files: List[str]) -> None:
+        """Merge the JSON files found for the specified prefix into a single list."""
         if not files:
             print(f"No files found for prefix: {prefix}")
             return
@@ -26,61 +48,64 @@ class JsonMerger:
         # Initialize the merged data and the next unique ID
         next_id = 1
         merged_data = []
+        seen_introductions = set()  # Introductions already merged, for O(1) duplicate checks
 
-        # Process the first file
-        first_file = files[0]
-        print(f"processing first file: {first_file}")
-        try:
-            with open(first_file, 'r', encoding='utf-8') as json_file:  # Ensure UTF-8 encoding
-                data = json.load(json_file)
-                for record in data['questions']:
+        # Parse all files in parallel; records are merged below in file order
+        with ProcessPoolExecutor(max_workers=min(len(files), self.max_workers)) as executor:
+            parsed = [executor.submit(_load_questions, file) for file in files]
+
+            # Process the first file
+            first_file = files[0]
+            print(f"processing first file: {first_file}")
+            try:
+                for record in parsed[0].result():
                     if isinstance(record, dict):
                         record['id'] = next_id  # Assign a unique ID
                         merged_data.append(record)
+                        seen_introductions.add(record.get('introduction', ''))
                         next_id += 1  # Increment the ID for the next record
                     else:
                         print(f"Unexpected record format: {record}")
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON from file: {first_file}")
-            return
-        except Exception as e:
-            print(f"An error occurred while processing file {first_file}: {str(e)}")
-            return
+            except json.JSONDecodeError:  # orjson.JSONDecodeError is a subclass
+                print(f"Error decoding JSON from file: {first_file}")
+                return
+            except Exception as e:
+                print(f"An error occurred while processing file {first_file}: {str(e)}")
+                return
 
-        # Process subsequent files
-        for file in files[1:]:
-            print(f"processing file: {file}")
-            try:
-                with open(file, 'r', encoding='utf-8') as json_file:  # Ensure UTF-8 encoding
-                    data = json.load(json_file)
-                    for record in data['questions']:
+            # Process subsequent files
+            for file, result in zip(files[1:], parsed[1:]):
+                print(f"processing file: {file}")
+                try:
+                    for record in result.result():
                         introduction_text = record.get('introduction', '')  # Assuming 'introduction' is the key
-                        if not any(existing_record['introduction'] == introduction_text for existing_record in merged_data):
+                        if introduction_text not in seen_introductions:
                             if isinstance(record, dict):
                                 record['id'] = next_id  # Assign a new unique ID
                                 merged_data.append(record)
+                                seen_introductions.add(introduction_text)
                                 next_id += 1  # Increment the ID for the next record
                             else:
                                 print(f"Unexpected record format: {record}")
                         else:
                             print(f"Introduction text already exists, skipping: {introduction_text}")
-            except json.JSONDecodeError:
-                print(f"Error decoding JSON from file: {file}")
-            except Exception as e:
-                print(f"An error occurred while processing file {file}: {str(e)}")
+                except json.JSONDecodeError:
+                    print(f"Error decoding JSON from file: {file}")
+                except Exception as e:
+                    print(f"An error occurred while processing file {file}: {str(e)}")
 
-        # Update the merged_data in the class
-        self.merged_data = {record['id']: record for record in merged_data}  # Use ID as the key
+        # Update the merged records in the class; ids are already unique and in order
+        self.merged_records = merged_data
 
     def validate_json(self) -> bool:
-        # Create a valid JSON structure from merged_data
+        # Create a valid JSON structure from merged_records
         valid_json = {
-            "questions": list(self.merged_data.values())  # Assuming merged_data contains question objects
+            "questions": self.merged_records  # merged_records contains question objects
         }
 
         try:
-            validate(instance=valid_json, schema=self.schema)
-        except ValidationError as e:
+            self._validate(valid_json)
+        except fastjsonschema.JsonSchemaException as e:
             print(f"Validation error: {e.message}")
             return False
         return True
@@ -88,8 +113,9 @@ class JsonMerger:
     def save_merged_file(self, prefix: str) -> None:
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         output_file = os.path.join(self.directory, f"{prefix}_merged_runs_{timestamp}.json")
-        with open(output_file, 'w', encoding='utf-8') as outfile:  # Ensure UTF-8 encoding
-            json.dump(list(self.merged_data.values()), outfile, indent=4, ensure_ascii=False)  # Prevent ASCII encoding
+        with open(output_file, 'wb') as outfile:
+            # orjson always emits UTF-8 without escaping non-ASCII characters
+            outfile.write(orjson.dumps(self.merged_records, option=orjson.OPT_INDENT_2))
 
     def process(self) -> None:
         self.load_schema()
@@ -97,15 +123,27 @@ class JsonMerger:
         print("Found JSON files:")  # Debugging: List of found JSON files
         for file in files:
             print(file)  # Print each file on a new line
-        prefixes = set(file.split('/')[-1].split('_')[0] for file in files if 'merged_runs' not in file)
-        print(f"Extracted prefixes (excluding merged_runs): {prefixes}")  # Debugging: List of extracted prefixes
-        for prefix in prefixes:
-            print(f"Processing prefix: {prefix}")  # Debugging: Current prefix being processed
-            self.merge_json_files(prefix)
-            if self.validate_json():
-                self.save_merged_file(prefix)
-            else:
-                print(f"Merged data for prefix '{prefix}' is not valid.")
+        # Group files by prefix from this single directory scan
+        groups = defaultdict(list)
+        for file in files:
+            if 'merged_runs' in file:
+                continue
+            groups[os.path.basename(file).partition('_')[0]].append(file)
+        print(f"Extracted prefixes (excluding merged_runs): {set(groups)}")  # Debugging: List of extracted prefixes
+        # Prefixes are independent, so each one is merged, validated and saved in its own
+        # process; the cores are split between them for the per-file parsing
+        workers_per_prefix = max(1, self.max_workers // max(1, len(groups)))
+        with ProcessPoolExecutor(max_workers=min(max(1, len(groups)), self.max_workers)) as executor:
+            results = []
+            for prefix, prefix_files in groups.items():
+                print(f"Processing prefix: {prefix}")  # Debugging: Current prefix being processed
+                results.append(executor.submit(
+                    _process_prefix, self.directory, self.schema, prefix, prefix_files, workers_per_prefix
+                ))
+            for result in results:
+                prefix, ok = result.result()
+                if not ok:
+                    print(f"Merged data for prefix '{prefix}' is not valid.")
 
 if __name__ == "__main__":
     directory = 'backend/data/questions'
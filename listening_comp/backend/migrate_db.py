@@ -21,6 +21,28 @@ def migrate_database():
                 print("Successfully added ffmpeg_file_location column")
             else:
                 print("ffmpeg_file_location column already exists")
+
+            # Index the column the question list is sorted by
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_questions_timestamp ON questions(timestamp)")
+            print("Successfully created timestamp index")
+
+            # Index audio file lookups; the partial index skips questions without audio yet
+            try:
+                cursor.execute(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_ffmpeg_loc "
+                    "ON questions(ffmpeg_file_location) WHERE ffmpeg_file_location IS NOT NULL"
+                )
+                print("Successfully created audio file index")
+            except sqlite3.IntegrityError:
+                # Older databases may share one audio file between questions; leave them for a manual fix
+                cursor.execute(
+                    "SELECT ffmpeg_file_location, GROUP_CONCAT(id) FROM questions "
+                    "WHERE ffmpeg_file_location IS NOT NULL "
+                    "GROUP BY ffmpeg_file_location HAVING COUNT(*) > 1"
+                )
+                print("Could not create the unique audio file index; these questions share an audio file:")
+                for location, question_ids in cursor.fetchall():
+                    print(f"  {location}: question ids {question_ids}")
                 
     except Exception as e:
         print(f"Error during migration: {str(e)}")
@@ -1,47 +1,136 @@
 import os
-import json
-import boto3
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
-from datetime import datetime
-from jsonschema import validate, ValidationError
-import chromadb
-from chromadb.config import Settings
-import logging
+import fastjsonschema
 from structured_data import BedrockChat
-from vector_store import BedrockEmbeddings
+from vector_store import BedrockEmbeddings, SqliteVecStore, VECTOR_DB_PATH
 
 __all__ = ['QuestionGenerator']
 
+# Static instructions, examples and output format for question generation. This is the
+# part of the prompt placed before the cachePoint, so it is built once at import time.
+_PROMPT_PREFIX = (
+    "You are a helpful assistant for generating JLPT N5 level listening comprehension questions in Japanese. Generate ONE question following these strict rules:\n\n"
+    "1. Use only JLPT N5 vocabulary and grammar patterns\n"
+    "2. The conversation MUST contain the context needed to answer the question\n"
+    "3. Questions should be simple and have ONE clear, specific correct answer\n"
+    "4. The conversation should be a natural, short dialogue between 2-3 people\n"
+    "5. Keep sentences short and use basic sentence structures\n"
+    "6. IMPORTANT: Do NOT ask questions about numbers, amounts, times, or clock times\n"
+    "7. Choose ONE of these question types: locations, objects, actions, preferences, descriptions, or reasons\n"
+    "8. IMPORTANT: Always use speaker indicators in the conversation (e.g., 男の人:, 女の人:, 学生:)\n"
+    "9. IMPORTANT: The conversation field must be a single line with speakers separated by spaces\n"
+    "10. IMPORTANT: Generate 4 multiple choice options in Japanese, where:\n"
+    "    - One option is the correct answer\n"
+    "    - Three options are plausible but incorrect\n"
+    "    - All options are grammatically correct and use N5 level vocabulary\n"
+    "    - Options should be clearly different from each other\n\n"
+    "Here are example question types (these are just examples, generate only ONE new question in Japanese):\n"
+    "1. Location:\n"
+    "Conversation: 男の人: 田中さんはどこですか？ 女の人: 図書館で勉強しています。\n"
+    "Question: 田中さんは今どこにいますか？\n"
+    "Options:\n1. 図書館\n2. 教室\n3. 公園\n4. レストラン\n"
+    "Answer: 図書館\n\n"
+    "2. Preference:\n"
+    "Conversation: 学生: 山田先生、休みの日は何をしますか？ 先生: そうですね。公園で散歩するのが好きです。\n"
+    "Question: 山田先生は休みの日に何をするのが好きですか？\n"
+    "Options:\n1. 公園で散歩する\n2. テレビを見る\n3. 本を読む\n4. 料理をする\n"
+    "Answer: 公園で散歩する\n\n"
+    "3. Object:\n"
+    "Conversation: 女の人: すみません、その赤いかばんを見せてください。 店の人: はい、どうぞ。 女の人: じゃあ、これをください。\n"
+    "Question: 女の人は何を買いますか？\n"
+    "Options:\n1. 赤いかばん\n2. 青いかばん\n3. 赤いくつ\n4. 白いぼうし\n"
+    "Answer: 赤いかばん\n\n"
+    "4. Action:\n"
+    "Conversation: 男の学生: 今日は学校のあと、何をしますか？ 女の学生: 友だちとプールで泳ぎます。\n"
+    "Question: 女の学生は学校のあと何をしますか？\n"
+    "Options:\n1. プールで泳ぐ\n2. 図書館で勉強する\n3. 家で寝る\n4. 友だちと映画を見る\n"
+    "Answer: プールで泳ぐ\n\n"
+    "5. Reason:\n"
+    "Conversation: 女の人: 昨日、どうしてパーティーに来ませんでしたか？ 男の人: すみません、かぜをひいていました。\n"
+    "Question: 男の人はどうしてパーティーに行きませんでしたか？\n"
+    "Options:\n1. かぜをひいていたから\n2. 仕事があったから\n3. 雨がふっていたから\n4. 道がわからなかったから\n"
+    "Answer: かぜをひいていたから\n\n"
+    "Generate ONE question in this JSON format, with ALL text in Japanese:\n"
+    "{\n"
+    "    \"generated_question\": [\n"
+    "        {\n"
+    "            \"introduction\": string (simple JLPT N5 setup),\n"
+    "            \"conversation\": string (natural dialogue with clear context, using speaker indicators, ALL ON ONE LINE),\n"
+    "            \"question\": string (specific question with one clear answer, NO time/number questions),\n"
+    "            \"options\": array (exactly 4 options in Japanese, first option must be the correct answer),\n"
+    "            \"answer\": string (short, specific answer, must match the first option)\n"
+    "        }\n"
+    "    ]\n"
+    "}\n"
+)
+
+# Per-request part of the prompt: context, question type and similar questions
+_PROMPT_TAIL = (
+    "Context: %s\nQuestion Type: %s\n\n"
+    "Here are some similar questions for reference:\n%s\n\n"
+    "Generate ONE question in the JSON format above, with ALL text in Japanese.\n"
+)
+
+def _extract_json_block(text: str) -> Optional[str]:
+    """
+    Returns the first balanced {...} block in text, ignoring braces inside JSON strings,
+    or None if there is none. Lets replies wrapped in Markdown fences or chatter be parsed.
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
 class QuestionGenerator:
     """
     A class for generating questions in the specified JSON format using Amazon Bedrock
     and leveraging a vector store for RAG.
     """
 
-    def __init__(self, bedrock_model_id: str = "amazon.nova-micro-v1:0", vector_store_dir: str = None):
+    # Schema and its compiled validator, loaded by the first instance
+    _json_schema = None
+    _validator = None
+
+    def __init__(self, bedrock_model_id: str = "amazon.nova-micro-v1:0", vector_db_path: str = VECTOR_DB_PATH):
         """
         Initializes the QuestionGenerator with a Bedrock model and a vector store.
         """
-        if vector_store_dir is None:
-            # Use absolute path based on the current file's location
-            vector_store_dir = os.path.join(os.path.dirname(__file__), "data", "vectorstore")
-        self.bedrock_chat = BedrockChat(model_id=bedrock_model_id)
-        # Load the schema
-        schema_path = os.path.join(os.path.dirname(__file__), "data", "json", "schema", "generated_question_schema.json")
-        with open(schema_path, "r") as f:
-            self.json_schema = json.load(f)
-
-        # Load the vector store with minimal logging
-        self.client = chromadb.PersistentClient(
-            path=vector_store_dir,
-            settings=Settings(
-                anonymized_telemetry=False,
-                is_persistent=True,
-                allow_reset=True
-            )
-        )
-        # Suppress ChromaDB logs
-        logging.getLogger('chromadb').setLevel(logging.ERROR)
+        # Latency-optimized inference cannot be combined with prompt caching, which the prompt uses
+        self.bedrock_chat = BedrockChat(model_id=bedrock_model_id, latency_optimized=False)
+        # Load and compile the schema once per process; all instances share the validator
+        if QuestionGenerator._validator is None:
+            schema_path = os.path.join(os.path.dirname(__file__), "data", "json", "schema", "generated_question_schema.json")
+            with open(schema_path, "rb") as f:
+                QuestionGenerator._json_schema = orjson.loads(f.read())
+            QuestionGenerator._validator = fastjsonschema.compile(QuestionGenerator._json_schema)
+        self.json_schema = QuestionGenerator._json_schema
+
+        # Similar questions are looked up in the sqlite-vec index written by vector_store.main
+        self.vector_store = SqliteVecStore(vector_db_path)
+        # Reused across queries
+        self.bedrock_embeddings = BedrockEmbeddings()
 
     def generate_question_json(self, question_type: int, context: str) -> Optional[Dict]:
         """
@@ -70,55 +159,63 @@ class QuestionGenerator:
 
         if json_response_string:
             try:
-                response_json = json.loads(json_response_string)
+                # Parse only the JSON object, skipping any fences or text the model adds around it
+                json_block = _extract_json_block(json_response_string) or json_response_string
+                response_json = orjson.loads(json_block)
                 # Validate the JSON against the schema
-                validate(instance=response_json, schema=self.json_schema)
+                self._validator(response_json)
                 return response_json
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 print(f"Error decoding JSON: {e}")
                 print(f"Failed JSON string: {json_response_string}")
                 return None
-            except ValidationError as e:
+            except fastjsonschema.JsonSchemaException as e:
                 print(f"JSON validation error: {e}")
                 print(f"Failed JSON string: {json_response_string}")
                 return None
         else:
             return None
 
+    def generate_many(self, question_type: int, contexts: List[str], max_workers: int = 8) -> List[Optional[Dict]]:
+        """
+        Generates one question per context concurrently, e.g. to pre-fill the question history.
+
+        Args:
+            question_type: The type of question to generate (1, 2, 3, or 4).
+            contexts: The contextual theme of each question to generate.
+            max_workers: The maximum number of Bedrock requests in flight at once.
+
+        Returns:
+            The generated questions in the same order as contexts, None where generation failed.
+        """
+        # Each call spends nearly all its time waiting on Bedrock, so threads overlap well
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                lambda context: self.generate_question_json(question_type, context),
+                contexts
+            ))
+
     def _get_similar_questions(self, context: str, question_type:int, collection_name: str, k: int = 3) -> List[str]:
         """
         Retrieves similar questions from the vector store based on the given context.
 
         Args:
             context: The context to search for similar questions.
+            question_type: The type of question to restrict the search to.
             k: The number of similar questions to retrieve.
 
         Returns:
             A list of strings containing similar questions.
         """
-        # Get the collection
-        collection = self.client.get_collection(name=collection_name)
         # Perform a similarity search using the context
-        bedrock_embeddings = BedrockEmbeddings()
-        query_embedding = bedrock_embeddings.generate_embedding(context)
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=k,
-            include =['documents', 'metadatas']
-        )
-        # Extract questions of the correct type
-        similar_questions = []
-        for i in range(len(results['ids'][0])):
-            result_metadata = results['metadatas'][0][i]
-            question_type_metadata = 0 #default to 0
-            if 'question_type' in result_metadata:
-                question_type_metadata = int(result_metadata['question_type'])
-            if question_type_metadata == question_type:
-                similar_questions.append(results['documents'][0][i])
-        
-        return similar_questions
-
-    def _build_prompt(self, question_type: int, context: str, similar_questions: List[str]) -> List[Dict[str, str]]:
+        query_embedding = self.bedrock_embeddings.generate_embedding(context)
+        if query_embedding is None:
+            return []
+        # Restrict the search to questions of the requested type inside the vector store,
+        # so all k results are usable instead of being filtered out afterwards
+        return self.vector_store.query(collection_name, query_embedding, k, question_type)
+
+    def _build_prompt(self, question_type: int, context: str, similar_questions: List[str]) -> List[Dict[str, Any]]:
         """
         Builds a prompt for the Bedrock model based on the question type, context,
         and similar questions from the vector store.
@@ -129,13 +226,19 @@ class QuestionGenerator:
             similar_questions: A list of similar questions from the vector store.
 
         Returns:
-            A string containing the formatted prompt.
+            The Converse messages, with the static instructions placed before a cache point.
         """
-        prompt = f"You are a helpful assistant for generating JLPT N5 level listening comprehension questions in Japanese. Generate ONE question following these strict rules:\n\n1. Use only JLPT N5 vocabulary and grammar patterns\n2. The conversation MUST contain the context needed to answer the question\n3. Questions should be simple and have ONE clear, specific correct answer\n4. The conversation should be a natural, short dialogue between 2-3 people\n5. Keep sentences short and use basic sentence structures\n6. IMPORTANT: Do NOT ask questions about numbers, amounts, times, or clock times\n7. Choose ONE of these question types: locations, objects, actions, preferences, descriptions, or reasons\n8. IMPORTANT: Always use speaker indicators in the conversation (e.g., 男の人:, 女の人:, 学生:)\n9. IMPORTANT: The conversation field must be a single line with speakers separated by spaces\n10. IMPORTANT: Generate 4 multiple choice options in Japanese, where:\n    - One option is the correct answer\n    - Three options are plausible but incorrect\n    - All options are grammatically correct and use N5 level vocabulary\n    - Options should be clearly different from each other\n\nContext: {context}\nQuestion Type: {question_type}\n\nHere are example question types (these are just examples, generate only ONE new question in Japanese):\n1. Location:\nConversation: 男の人: 田中さんはどこですか？ 女の人: 図書館で勉強しています。\nQuestion: 田中さんは今どこにいますか？\nOptions:\n1. 図書館\n2. 教室\n3. 公園\n4. レストラン\nAnswer: 図書館\n\n2. Preference:\nConversation: 学生: 山田先生、休みの日は何をしますか？ 先生: そうですね。公園で散歩するのが好きです。\nQuestion: 山田先生は休みの日に何をするのが好きですか？\nOptions:\n1. 公園で散歩する\n2. テレビを見る\n3. 本を読む\n4. 料理をする\nAnswer: 公園で散歩する\n\nHere are some similar questions for reference:\n" + '\n'.join(similar_questions) + "\n\nGenerate ONE question in this JSON format, with ALL text in Japanese:\n{\n    \"generated_question\": [\n        {\n            \"introduction\": string (simple JLPT N5 setup),\n            \"conversation\": string (natural dialogue with clear context, using speaker indicators, ALL ON ONE LINE),\n            \"question\": string (specific question with one clear answer, NO time/number questions),\n            \"options\": array (exactly 4 options in Japanese, first option must be the correct answer),\n            \"answer\": string (short, specific answer, must match the first option)\n        }\n    ]\n}\n"
+        # Static instructions and examples come first so Bedrock can cache them behind
+        # the cachePoint; only the short tail after it changes between calls
+        tail = _PROMPT_TAIL % (context, question_type, '\n'.join(similar_questions))
 
         return [{
             "role": "user",
-            "content": prompt
+            "content": [
+                {"text": _PROMPT_PREFIX},
+                {"cachePoint": {"type": "default"}},
+                {"text": tail}
+            ]
         }]
         
 # Example usage:
@@ -1,20 +1,39 @@
 import sqlite3
-import json
+import logging
+import orjson
+import random
+import threading
 from datetime import datetime
 import os
 
+logger = logging.getLogger(__name__)
+
+def _shuffle_options(question_data: dict) -> dict:
+    """Fix the display order of the options once, stored with the question as shuffled_options"""
+    options = question_data.get('options')
+    if options and 'shuffled_options' not in question_data:
+        question_data['shuffled_options'] = random.sample(options, len(options))
+    return question_data
+
 class QuestionStore:
     def __init__(self):
         # Store SQLite database in backend/data/sqlite
         db_dir = os.path.join(os.path.dirname(__file__), "data", "sqlite")
         os.makedirs(db_dir, exist_ok=True)
         self.db_path = os.path.join(db_dir, "questions.db")
+        # One long-lived connection in autocommit mode, shared by all calls and guarded by a lock
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._lock = threading.Lock()
         self._init_db()
 
     def _init_db(self):
         """Initialize the database with required tables"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
+        with self._lock:
+            self._conn.execute("""
                 CREATE TABLE IF NOT EXISTS questions (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     timestamp TEXT NOT NULL,
@@ -23,45 +42,106 @@ class QuestionStore:
                     ffmpeg_file_location TEXT
                 )
             """)
+            # Scanned backwards for the ORDER BY timestamp DESC in get_all_questions, avoiding a sort
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_timestamp ON questions(timestamp)")
 
     def save_question(self, context: str, question_data: dict, ffmpeg_file_location: str = None) -> int:
         """Save a new question to the database"""
-        print("\n=== Save_Question ===")
-        print(f"Context: {context}")
-        print(f"introduction Data: {question_data.get('introduction', '')}")
-        print(f"conversation Data: {question_data.get('conversation', '')}")
-        print(f"question Data: {question_data.get('question', '')}")
-        print(f"Audio File: {ffmpeg_file_location}")
-        print("===============================\n")
-            
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        # Checked first so the arguments are not even looked up when debug logging is off
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "save_question context=%s introduction=%s conversation=%s question=%s audio=%s",
+                context, question_data.get('introduction', ''), question_data.get('conversation', ''),
+                question_data.get('question', ''), ffmpeg_file_location
+            )
+
+        # Shuffled in place, so the caller's question carries the same order as the stored one
+        _shuffle_options(question_data)
+        with self._lock:
+            cursor = self._conn.cursor()
             cursor.execute(
                 "INSERT INTO questions (timestamp, context, question_data, ffmpeg_file_location) VALUES (?, ?, ?, ?)",
-                (datetime.now().isoformat(), context, json.dumps(question_data), ffmpeg_file_location)
+                (datetime.now().isoformat(), context, orjson.dumps(question_data).decode(), ffmpeg_file_location)
             )
             return cursor.lastrowid
 
-    def get_all_questions(self):
-        """Retrieve all questions ordered by timestamp"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM questions ORDER BY timestamp DESC")
+    def save_questions(self, rows: list) -> list:
+        """Save a batch of (context, question_data, ffmpeg_file_location) rows in one transaction.
+
+        Returns the new question ids in the same order as rows.
+        """
+        if not rows:
+            return []
+        timestamp = datetime.now().isoformat()
+        params = [
+            (timestamp, context, orjson.dumps(_shuffle_options(question_data)).decode(), ffmpeg_file_location)
+            for context, question_data, ffmpeg_file_location in rows
+        ]
+
+        with self._lock:
+            cursor = self._conn.cursor()
+            # IMMEDIATE takes the write lock up front, so the new ids are the last len(rows) ids
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.executemany(
+                    "INSERT INTO questions (timestamp, context, question_data, ffmpeg_file_location) VALUES (?, ?, ?, ?)",
+                    params
+                )
+                cursor.execute("SELECT id FROM questions ORDER BY id DESC LIMIT ?", (len(params),))
+                ids = [row['id'] for row in cursor.fetchall()][::-1]
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            return ids
+
+    def get_all_questions(self, limit: int = 50, offset: int = 0):
+        """Retrieve a page of questions ordered by timestamp, newest first.
+
+        Only the columns needed for listing are read: the question_data blob is not
+        loaded or parsed, apart from its introduction. Use get_question_data for the rest.
+        """
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute(
+                """
+                SELECT id, timestamp, context,
+                       json_extract(question_data, '$.introduction') AS introduction,
+                       ffmpeg_file_location
+                FROM questions
+                ORDER BY timestamp DESC
+                LIMIT ? OFFSET ?
+                """,
+                (limit, offset)
+            )
             rows = cursor.fetchall()
             return [{
                 'id': row['id'],
                 'timestamp': row['timestamp'],
                 'context': row['context'],
-                'question_data': json.loads(row['question_data']),
+                'introduction': row['introduction'] or '',
                 'ffmpeg_file_location': row['ffmpeg_file_location']
             } for row in rows]
 
+    def count_questions(self) -> int:
+        """Return the number of stored questions"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+    def get_question_data(self, question_id: int):
+        """Retrieve and parse the question_data of a specific question"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("SELECT question_data FROM questions WHERE id = ?", (question_id,))
+            row = cursor.fetchone()
+            if row:
+                return orjson.loads(row['question_data'])
+            return None
+
     def get_question(self, question_id: int):
         """Retrieve a specific question by ID"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self._conn.cursor()
             cursor.execute("SELECT * FROM questions WHERE id = ?", (question_id,))
             row = cursor.fetchone()
             if row:
@@ -69,14 +149,14 @@ class QuestionStore:
                     'id': row['id'],
                     'timestamp': row['timestamp'],
                     'context': row['context'],
-                    'question_data': json.loads(row['question_data']),
+                    'question_data': orjson.loads(row['question_data']),
                     'ffmpeg_file_location': row['ffmpeg_file_location']
                 }
             return None
     def update_question_audio(self, question_id: int, audio_file: str):
         """Update a question with its audio file location"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self._conn.cursor()
             cursor.execute(
                 "UPDATE questions SET ffmpeg_file_location = ? WHERE id = ?",
                 (audio_file, question_id)
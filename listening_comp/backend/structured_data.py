@@ -1,35 +1,78 @@
 import os
-import boto3
-import json
+import threading
+import orjson
 from typing import List, Dict, Any, Optional
 from pprint import pprint  # Import pprint for pretty printing
-from jsonschema import validate, ValidationError
+import fastjsonschema
 from datetime import datetime
 
 # Model ID
 MODEL_ID = "amazon.nova-micro-v1:0"
 
+# Connection pool sized for the concurrent embedding workers in vector_store
+BEDROCK_CLIENT_CONFIG = dict(
+    max_pool_connections=32,
+    retries={'max_attempts': 5, 'mode': 'adaptive'},
+    connect_timeout=2,
+    read_timeout=60
+)
+_bedrock_client = None
+_bedrock_client_lock = threading.Lock()
+
+def get_bedrock_client():
+    """Return the bedrock-runtime client shared by every chat and embedding instance"""
+    global _bedrock_client
+    with _bedrock_client_lock:
+        if _bedrock_client is None:
+            # boto3 is imported on first use so importing this module stays cheap
+            import boto3
+            from botocore.config import Config
+            _bedrock_client = boto3.client('bedrock-runtime', region_name="us-east-1", config=Config(**BEDROCK_CLIENT_CONFIG))
+        return _bedrock_client
+
 class BedrockChat:
-    def __init__(self, model_id: str = MODEL_ID):
-        """Initialize Bedrock chat client"""
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name="us-east-1")
+    def __init__(self, model_id: str = MODEL_ID, latency_optimized: bool = False):
+        """Initialize Bedrock chat client
+
+        latency_optimized requests Bedrock's latency-optimized inference. Only some models
+        offer it, in some regions, so it is opt-in; if Bedrock rejects it, the client
+        falls back to standard inference.
+        """
+        self.bedrock_client = get_bedrock_client()
         self.model_id = model_id
+        self.performance_config = {"latency": "optimized" if latency_optimized else "standard"}
 
     def generate_response(self, messages: List[Dict[str, str]], inference_config: Optional[Dict[str, Any]] = None) -> Optional[str]:
         """Generate a response using Amazon Bedrock"""
         if inference_config is None:
             inference_config = {"temperature": 0.7}
 
-        # Ensure the content is a list of dictionaries
+        # Ensure the content is a list of dictionaries; content blocks (e.g. with a
+        # cachePoint) are passed through unchanged
         for message in messages:
-            message['content'] = [{"text": message['content']}]
+            if isinstance(message['content'], str):
+                message['content'] = [{"text": message['content']}]
 
         try:
-            response = self.bedrock_client.converse(
-                modelId=self.model_id,
-                messages=messages,
-                inferenceConfig=inference_config
-            )
+            try:
+                response = self.bedrock_client.converse(
+                    modelId=self.model_id,
+                    messages=messages,
+                    inferenceConfig=inference_config,
+                    performanceConfig=self.performance_config
+                )
+            except self.bedrock_client.exceptions.ValidationException:
+                if self.performance_config["latency"] == "standard":
+                    raise
+                # Latency-optimized inference is not offered for this model/region; stop asking for it
+                print(f"Latency-optimized inference unavailable for {self.model_id}, using standard")
+                self.performance_config = {"latency": "standard"}
+                response = self.bedrock_client.converse(
+                    modelId=self.model_id,
+                    messages=messages,
+                    inferenceConfig=inference_config,
+                    performanceConfig=self.performance_config
+                )
             return response['output']['message']['content'][0]['text']
             
         except Exception as e:
@@ -37,12 +80,26 @@ class BedrockChat:
             return None
 
 class TranscriptExtractor:
+    SCHEMA_PATH = 'backend/data/json/schema/json_response_schema.json'
+    # Schema and its compiled validator, loaded on the first extraction
+    _schema = None
+    _validator = None
+
     def __init__(self, transcript: List[Dict[str, str]], prompt_file: str = 'backend/data/prompts/claude_json_prompt.md'):
         """Initialize the TranscriptExtractor with a transcript."""
         self.transcript = transcript
         self.bedrock_chat = BedrockChat()
         self.prompt = self.load_prompt(prompt_file)
 
+    @classmethod
+    def _get_validator(cls):
+        """Load and compile the response schema on first use; shared by all instances."""
+        if cls._validator is None:
+            with open(cls.SCHEMA_PATH, 'rb') as schema_file:
+                cls._schema = orjson.loads(schema_file.read())
+            cls._validator = fastjsonschema.compile(cls._schema)
+        return cls._validator
+
     def load_prompt(self, prompt_file: str) -> str:
         """Load the prompt from a file."""
         try:
@@ -55,31 +112,23 @@ class TranscriptExtractor:
     def extract_structured_data(self) -> Any:
         """Extract structured json data from the transcript using Amazon Bedrock."""
 
-        # Prepare the full prompt for Bedrock
-        full_prompt = self.prompt + "\n" + "Transcript:\n"
-
-        # Append the transcript to the prompt
-        for entry in self.transcript:
-            full_prompt += entry['text'] + "\n"
+        # Prepare the full prompt for Bedrock, joining the transcript in a single pass
+        body = "\n".join(entry['text'] for entry in self.transcript)
+        full_prompt = f"{self.prompt}\nTranscript:\n{body}\n"
 
         # Generate a response using the prompt
         response = self.bedrock_chat.generate_response([{"role": "user", "content": full_prompt}])
         
-        # Load the JSON schema
-        schema_path = 'backend/data/json/schema/json_response_schema.json'
-        with open(schema_path, 'r', encoding='utf-8') as schema_file:
-            schema = json.load(schema_file)
-
         # Validate the response against the schema
         try:
             # Assuming response is a JSON string, parse it
-            response_data = json.loads(response)
-            validate(instance=response_data, schema=schema)
+            response_data = orjson.loads(response)
+            self._get_validator()(response_data)
             return response_data  # Return the validated response
 
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             raise ValueError("Response is not valid JSON.")
-        except ValidationError as e:
+        except fastjsonschema.JsonSchemaException as e:
             raise ValueError(f"Response does not conform to schema: {e.message}")
 
 
@@ -108,8 +157,8 @@ def main():
         output_file_path = f"{output_dir}/{os.path.basename(transcript_file_path).replace('.txt', f'_{timestamp}_data.json')}"
         
         # Save the structured data to a JSON file
-        with open(output_file_path, 'w', encoding='utf-8') as json_file:
-            json.dump(json_response, json_file, ensure_ascii=False, indent=4)
+        with open(output_file_path, 'wb') as json_file:
+            json_file.write(orjson.dumps(json_response, option=orjson.OPT_INDENT_2))
         
         # Print the structured data using pprint for better readability
         print(json_response)  # Use pprint to pretty print the structured data
@@ -1,35 +1,113 @@
 import os
-import json
-import boto3 #import boto3
+import orjson
+import hashlib
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
-from datetime import datetime
-import chromadb  # Import ChromaDB
-from chromadb.config import Settings
-from structured_data import BedrockChat #Removed BedrockEmbeddings import
+import numpy as np
+import sqlite_vec
+from structured_data import BedrockChat, get_bedrock_client #Removed BedrockEmbeddings import
 
 
 # Model ID for Amazon Bedrock
 MODEL_ID = "amazon.nova-micro-v1:0"
 # Model ID for Amazon Bedrock Titan Embeddings Model
 EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v1"
+# Concurrent invoke_model calls when embedding a batch of questions
+EMBEDDING_WORKERS = 16
+# Embedding cache, stored next to questions.db
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(__file__), "data", "sqlite", "embeddings.db")
+# sqlite-vec index of question embeddings used for similar-question lookups
+VECTOR_DB_PATH = os.path.join(os.path.dirname(__file__), "data", "sqlite", "vectors.db")
+# Titan text embeddings v1 output size
+EMBEDDING_DIMENSIONS = 1536
+
+class EmbeddingCache:
+    """Persistent cache of embeddings keyed by SHA-256 of (model id, text), stored as float16"""
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_PATH):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # One connection shared by every thread that generates embeddings
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache_fp16 (hash TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._migrate_float32_cache()
+
+    def _migrate_float32_cache(self) -> None:
+        """Move embeddings cached at float32 by earlier versions into the float16 table, then drop the old table"""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'embedding_cache'"
+        ).fetchone()
+        if not exists:
+            return
+        rows = self._conn.execute("SELECT hash, vector FROM embedding_cache").fetchall()
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO embedding_cache_fp16 (hash, vector) VALUES (?, ?)",
+            ((key, np.frombuffer(vector, dtype=np.float32).astype(np.float16).tobytes()) for key, vector in rows)
+        )
+        self._conn.execute("DROP TABLE embedding_cache")
+
+    @staticmethod
+    def key(model_id: str, text: str) -> str:
+        return hashlib.sha256(f"{model_id}|{text}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embedding_cache_fp16 WHERE hash = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float16).astype(np.float32).tolist()
+
+    @staticmethod
+    def quantize(embedding: List[float]) -> List[float]:
+        """Round an embedding to float16 precision, the precision it is cached at"""
+        return np.asarray(embedding, dtype=np.float16).astype(np.float32).tolist()
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        # Stored as packed float16: half the size of float32, and similarity ranking is unaffected
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embedding_cache_fp16 (hash, vector) VALUES (?, ?)",
+                (key, np.asarray(embedding, dtype=np.float16).tobytes())
+            )
 
 class BedrockEmbeddings:
-    def __init__(self, model_id: str = EMBEDDING_MODEL_ID):
+    def __init__(self, model_id: str = EMBEDDING_MODEL_ID, cache: Optional[EmbeddingCache] = None):
         """Initialize Bedrock embeddings client"""
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name="us-east-1")
+        self.bedrock_client = get_bedrock_client()
         self.model_id = model_id
+        self.cache = cache if cache is not None else EmbeddingCache()
 
     def generate_embedding(self, text: str) -> Optional[List[float]]:
-        """Generate an embedding using Amazon Bedrock"""
+        """Generate an embedding using Amazon Bedrock, reusing cached embeddings for repeated text"""
+        key = EmbeddingCache.key(self.model_id, text)
+        embedding = self.cache.get(key)
+        if embedding is not None:
+            return embedding
+
+        embedding = self._invoke_model(text)
+        if embedding is not None:
+            # Fresh embeddings are rounded the same way as cached ones, so both paths agree
+            embedding = EmbeddingCache.quantize(embedding)
+            self.cache.put(key, embedding)
+        return embedding
+
+    def _invoke_model(self, text: str) -> Optional[List[float]]:
+        """Request an embedding from Amazon Bedrock"""
         try:
-            body = json.dumps({"inputText": text})
+            body = orjson.dumps({"inputText": text})
             response = self.bedrock_client.invoke_model(
                 body=body,
                 modelId=self.model_id,
                 accept="application/json",
                 contentType="application/json"
             )
-            response_body = json.loads(response.get('body').read())
+            response_body = orjson.loads(response.get('body').read())
             return response_body.get('embedding')
         except Exception as e:
             print(f"Error generating embedding: {str(e)}")
@@ -41,34 +119,54 @@ class ChromaDBEmbedder:
         self.bedrock_chat = BedrockChat(model_id)
         self.bedrock_embeddings = BedrockEmbeddings()
         self.db_directory = db_directory
+        # Imported here: chromadb takes seconds to import and only this class needs it
+        import chromadb
+        from chromadb.config import Settings
         self.client = chromadb.PersistentClient(path=self.db_directory, settings=Settings(allow_reset=True))
+        self._collections = {}
+
+    def _get_collection(self, collection_name: str):
+        """Get or create the named collection, fetching it from ChromaDB only once."""
+        if collection_name not in self._collections:
+            self._collections[collection_name] = self.client.get_or_create_collection(name=collection_name)
+        return self._collections[collection_name]
 
     def embed_data(self, collection_name: str, data: List[Dict[str, Any]]) -> None:
         """Embed structured data into ChromaDB."""
         #Get or create the collection
-        collection = self.client.get_or_create_collection(name=collection_name)
-
-        ids = []
-        embeddings = []
-        metadatas = []
-
-        for entry in data:
-            # Generate embedding using Bedrock
-            embedding = self.bedrock_embeddings.generate_embedding(entry['question']) #<--- Changed this line
-            ids.append(str(entry['id']))
-            embeddings.append(embedding) #<--- Changed this line
-            metadatas.append({"introduction": entry['introduction']})
+        collection = self._get_collection(collection_name)
+
+        # Generate embeddings using Bedrock concurrently; map keeps them in data order
+        with ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS) as executor:
+            embeddings = list(executor.map(
+                self.bedrock_embeddings.generate_embedding,
+                [entry['question'] for entry in data]
+            ))
+
+        ids = [str(entry['id']) for entry in data]
+        # question_type is stored so queries can filter on it with a `where` clause
+        metadatas = [
+            {
+                "introduction": entry['introduction'],
+                "question_type": int(entry.get('question_type', 0)),
+                "question": entry['question']
+            }
+            for entry in data
+        ]
+        # The question text is stored as the document so similarity queries can return it
+        documents = [entry['question'] for entry in data]
             
         collection.add(
             ids=ids,
             embeddings=embeddings,
-            metadatas=metadatas
+            metadatas=metadatas,
+            documents=documents
         )
 
     def semantic_search(self, collection_name:str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Perform semantic search in ChromaDB."""
         #Get the collection
-        collection = self.client.get_collection(name=collection_name)
+        collection = self._get_collection(collection_name)
         query_embedding = self.bedrock_embeddings.generate_embedding(query) #<--- Changed this line
 
         results = collection.query(
@@ -77,33 +175,106 @@ class ChromaDBEmbedder:
         )
         return results
 
+class SqliteVecStore:
+    """Question embeddings in sqlite-vec vec0 tables, one table per collection"""
+
+    def __init__(self, db_path: str = VECTOR_DB_PATH, dimensions: int = EMBEDDING_DIMENSIONS):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.dimensions = dimensions
+        self.bedrock_embeddings = None
+        # One connection shared by every caller and guarded by a lock, as in EmbeddingCache
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.enable_load_extension(True)
+        sqlite_vec.load(self._conn)
+        self._conn.enable_load_extension(False)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _table(collection_name: str) -> str:
+        # Collection names become table names, so only plain identifiers are accepted
+        if not re.fullmatch(r'\w+', collection_name):
+            raise ValueError(f"Invalid collection name: {collection_name}")
+        return f'"{collection_name}"'
+
+    def _create_table(self, collection_name: str) -> None:
+        # question_type is a metadata column so KNN queries can filter on it;
+        # the + columns are stored alongside but not indexed
+        self._conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self._table(collection_name)} USING vec0("
+            f"embedding float[{self.dimensions}], question_type integer, +introduction text, +question text)"
+        )
+
+    def embed_data(self, collection_name: str, data: List[Dict[str, Any]]) -> None:
+        """Embed structured data into the sqlite-vec index, replacing rows with the same id."""
+        if self.bedrock_embeddings is None:
+            self.bedrock_embeddings = BedrockEmbeddings()
+        with ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS) as executor:
+            embeddings = list(executor.map(
+                self.bedrock_embeddings.generate_embedding,
+                [entry['question'] for entry in data]
+            ))
+
+        table = self._table(collection_name)
+        rows = [
+            (
+                int(entry['id']),
+                sqlite_vec.serialize_float32(embedding),
+                int(entry.get('question_type', 0)),
+                entry['introduction'],
+                entry['question']
+            )
+            for entry, embedding in zip(data, embeddings)
+            if embedding is not None
+        ]
+        with self._lock, self._conn:
+            self._create_table(collection_name)
+            # vec0 tables have no upsert, so existing rows are deleted first
+            self._conn.executemany(f"DELETE FROM {table} WHERE rowid = ?", [(row[0],) for row in rows])
+            self._conn.executemany(
+                f"INSERT INTO {table} (rowid, embedding, question_type, introduction, question) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def query(self, collection_name: str, embedding: List[float], k: int, question_type: int) -> List[str]:
+        """Return the questions of the given type nearest to the embedding, closest first."""
+        table = self._table(collection_name)
+        with self._lock:
+            try:
+                rows = self._conn.execute(
+                    f"SELECT question FROM {table} WHERE embedding MATCH ? AND k = ? AND question_type = ? ORDER BY distance",
+                    (sqlite_vec.serialize_float32(embedding), k, int(question_type))
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                # The collection has not been embedded yet
+                print(f"Error querying vector store: {str(e)}")
+                return []
+        return [row[0] for row in rows]
+
+# Merged runs are saved as <prefix>_merged_runs_<YYYYMMDD>_<HHMMSS>.json
+MERGED_RUNS_PATTERN = re.compile(r'^.*merged_runs_(\d{8})_(\d{6})\.json$')
+
 class QuestionDataLoader:
     @staticmethod
     def load_latest_data(directory: str) -> List[Dict[str, Any]]:
         """Load the latest merged_runs JSON file from the specified directory."""
-        latest_file = None
-        latest_timestamp = datetime.min
-
-        for filename in os.listdir(directory):
-            if 'merged_runs' in filename and filename.endswith('.json'):
-                # Extract timestamp from filename
-                parts = filename.split('_')
-                if len(parts) >= 5:
-                    date_str = parts[3]
-                    time_str = parts[4].replace(".json", "")
-                    timestamp_str = f"{date_str}_{time_str}"
-                    timestamp = datetime.strptime(timestamp_str, '%Y%m%d_%H%M%S')
-
-                    if timestamp > latest_timestamp:
-                        latest_timestamp = timestamp
-                        latest_file = filename
-                else:
-                    print(f"Unexpected filename format: {filename}. Skipping file.")
+        # Collect (date, time, filename) for every merged_runs file in a single directory pass;
+        # the fixed-width YYYYMMDD/HHMMSS strings compare correctly without parsing dates
+        candidates = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if 'merged_runs' not in entry.name or not entry.name.endswith('.json'):
                     continue
+                match = MERGED_RUNS_PATTERN.match(entry.name)
+                if match:
+                    candidates.append((match.group(1), match.group(2), entry.name))
+                else:
+                    print(f"Unexpected filename format: {entry.name}. Skipping file.")
+
+        latest_file = max(candidates)[2] if candidates else None
 
         if latest_file:
-            with open(os.path.join(directory, latest_file), 'r', encoding='utf-8') as json_file:
-                json_data = json.load(json_file)
+            with open(os.path.join(directory, latest_file), 'rb') as json_file:
+                json_data = orjson.loads(json_file.read())
 
                 #Check if the file is formated correctly
                 if not isinstance(json_data, list):
@@ -128,6 +299,11 @@ def main():
     embedder.embed_data(collection_name, questions_data)
     print(f"Questions embedded successfully into ChromaDB in directory: {chroma_db_directory}.")
 
+    # Embed the same questions into the sqlite-vec index used by QuestionGenerator;
+    # the embeddings come from the cache filled by the ChromaDB pass above
+    SqliteVecStore().embed_data(collection_name, questions_data)
+    print(f"Questions embedded successfully into sqlite-vec database: {VECTOR_DB_PATH}.")
+
     # Perform a semantic search
     # user_query = input("Enter a question to search for similar questions: ")
     # search_results = embedder.semantic_search(collection_name, user_query)
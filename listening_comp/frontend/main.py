@@ -1,7 +1,9 @@
 import streamlit as st
 import sys
 import os
+import logging
 import random
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
@@ -14,6 +16,7 @@ from question_generator import QuestionGenerator
 from question_store import QuestionStore
 from audio_generator import AudioGenerator
 
+logger = logging.getLogger(__name__)
 
 # Page config
 st.set_page_config(
@@ -33,6 +36,102 @@ if 'current_question' not in st.session_state:
     st.session_state.answered = False
     st.session_state.button_state = "check"
 
+def get_question_generator():
+    """Return this session's QuestionGenerator, creating it on first use"""
+    if 'question_generator' not in st.session_state:
+        st.session_state.question_generator = QuestionGenerator()
+    return st.session_state.question_generator
+
+def get_audio_generator():
+    """Return this session's AudioGenerator, creating it on first use"""
+    if 'audio_generator' not in st.session_state:
+        st.session_state.audio_generator = AudioGenerator()
+    return st.session_state.audio_generator
+
+def get_prefetch_executor():
+    """Return this session's single background worker used to prefetch questions"""
+    if 'prefetch_executor' not in st.session_state:
+        st.session_state.prefetch_executor = ThreadPoolExecutor(max_workers=1)
+    return st.session_state.prefetch_executor
+
+def get_audio_executor():
+    """Return this session's background worker for question audio"""
+    if 'audio_executor' not in st.session_state:
+        st.session_state.audio_executor = ThreadPoolExecutor(max_workers=1)
+    return st.session_state.audio_executor
+
+def generate_and_update_audio(audio_generator, question_store, question, question_id):
+    """Generate a question's audio and record its path; returns the file or None. Runs on the audio thread."""
+    audio_file = audio_generator.generate_question_audio(question, question_id)
+    logger.debug("Audio file: %s", audio_file)
+    if audio_file:
+        question_store.update_question_audio(question_id, audio_file)
+        question['audio_file'] = audio_file
+    return audio_file
+
+def generate_question(question_generator, question_type, context):
+    """Generate a question without saving it; returns the question or None. Runs on the prefetch thread."""
+    generated_content = question_generator.generate_question_json(question_type, context)
+    if not generated_content or "generated_question" not in generated_content:
+        return None
+    return generated_content["generated_question"][0]
+
+def prefetch_next_question(context, question_type=4):
+    """Start generating the next question in the background, unless one is already underway for this context.
+
+    The prefetched question is only kept in memory; it is saved and its audio generated once it is taken.
+    """
+    key = (context, question_type)
+    if 'next_q_future' in st.session_state:
+        if st.session_state.get('next_q_key') == key:
+            return
+        # Stale prefetch for another context: drop it, and skip it if it has not started yet
+        st.session_state.pop('next_q_future').cancel()
+    st.session_state.next_q_future = get_prefetch_executor().submit(
+        generate_question, get_question_generator(), question_type, context
+    )
+    st.session_state.next_q_key = key
+
+def take_next_question(context, question_type=4):
+    """Return the prefetched question for this context, or generate one now if there is none.
+
+    The question is saved here, and its audio generated in the background for the audio panel.
+    """
+    question = None
+    future = st.session_state.pop('next_q_future', None)
+    prefetched_key = st.session_state.pop('next_q_key', None)
+    if future is not None:
+        if prefetched_key == (context, question_type):
+            try:
+                question = future.result()
+            except Exception:
+                logger.exception("Error prefetching question")
+        else:
+            future.cancel()
+    if not question:
+        question = generate_question(get_question_generator(), question_type, context)
+    if not question:
+        return None
+    question_id = st.session_state.question_store.save_question(context, question)
+    audio_future = get_audio_executor().submit(
+        generate_and_update_audio, get_audio_generator(),
+        st.session_state.question_store, question, question_id
+    )
+    st.session_state.pending_audio = (question, audio_future)
+    return question
+
+# Questions listed per sidebar page
+SIDEBAR_PAGE_SIZE = 50
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_question_page(_question_store, page, question_count):
+    """Load one sidebar page of questions.
+
+    question_count is part of the cache key, so saving or deleting a question refreshes the list;
+    the ttl picks up audio paths written after a question was saved.
+    """
+    return _question_store.get_all_questions(limit=SIDEBAR_PAGE_SIZE, offset=(page - 1) * SIDEBAR_PAGE_SIZE)
+
 def render_header():
     """Render the header section"""
     st.title("🎌 Japanese Learning Assistant")
@@ -50,16 +149,22 @@ def render_question_sidebar():
     """Render sidebar with previous questions"""
     with st.sidebar:
         st.header("Previous Questions")
-        questions = st.session_state.question_store.get_all_questions()
+        question_store = st.session_state.question_store
+        question_count = question_store.count_questions()
+        page_count = max(1, -(-question_count // SIDEBAR_PAGE_SIZE))
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1) if page_count > 1 else 1
+        questions = load_question_page(question_store, page, question_count)
         
         for q in questions:
             # Create a unique key for each button using the question ID
-            intro = q['question_data'].get('introduction', '')  # Safely get introduction
+            intro = q['introduction']
             if st.button(
                 f"[{format_timestamp(q['timestamp'])}] {intro[:30]}...",
                 key=f"q_{q['id']}"
             ):
-                st.session_state.current_question = q['question_data']
+                # The list only carries summary columns; load the full question on demand
+                question_data = st.session_state.question_store.get_question_data(q['id'])
+                st.session_state.current_question = question_data
                 st.session_state.answered = False
                 st.session_state.button_state = "check"
                 
@@ -67,8 +172,7 @@ def render_question_sidebar():
                 audio_file = q.get('ffmpeg_file_location', '')
                 if not audio_file or not os.path.exists(audio_file):
                     # Generate audio file if missing
-                    audio_generator = AudioGenerator()
-                    audio_file = audio_generator.generate_question_audio(
+                    audio_file = get_audio_generator().generate_question_audio(
                         st.session_state.current_question, q['id']
                     )
                     
@@ -77,21 +181,20 @@ def render_question_sidebar():
                         st.session_state.question_store.update_question_audio(q['id'], audio_file)
                         st.session_state.current_question['audio_file'] = audio_file
                 
-                # Set audio file in session
-                st.session_state.current_question['audio_file'] = q.get('ffmpeg_file_location', '')
+                # Set audio file in session (the listed path may predate a regenerated file)
+                st.session_state.current_question['audio_file'] = audio_file
                 
-                # Debug: Print session context
-                print("\n=== Session Context ===")
-                print(f"Current Question: {st.session_state.current_question}")
-                print(f"Answered: {st.session_state.answered}")
-                print(f"Button State: {st.session_state.button_state}")
-                print(f"Audio File Path: {st.session_state.current_question['audio_file']}")
-                print("=======================\n")
+                # Debug: log session context; %s arguments are only formatted when debug is enabled
+                logger.debug(
+                    "Session context: question=%s answered=%s button_state=%s audio_file=%s",
+                    st.session_state.current_question, st.session_state.answered,
+                    st.session_state.button_state, st.session_state.current_question['audio_file']
+                )
 
                 # Show debug window with stored question data
                 question_data = {
                     'context': q.get('context', ''),
-                    'question': q['question_data'],
+                    'question': question_data,
                     'audio_file': q.get('audio_file', ''),
                     'question_id': q['id']
                 }
@@ -100,9 +203,9 @@ def render_question_sidebar():
 
 def render_interactive_learning():
     """Render the interactive learning stage"""
-    # Initialize question generator and audio generator
-    question_generator = QuestionGenerator()
-    audio_generator = AudioGenerator()
+    # Reuse the session's generators instead of constructing them on every rerun
+    question_generator = get_question_generator()
+    audio_generator = get_audio_generator()
     
     # Context selection for question generation
     context = st.selectbox(
@@ -125,37 +228,35 @@ def render_interactive_learning():
             current_question
             )
 
-            # Generate audio file
-            audio_file = audio_generator.generate_question_audio(current_question, question_id)
-            print("\n=== Audio_File ===")
-            print(f"Audio File: {audio_file}")
-            print("===============================\n")
-            
-            if audio_file:
-                st.session_state.question_store.update_question_audio(question_id, audio_file)
+            # Show the question right away; its audio is generated in the background
+            # and the audio panel waits for it
+            audio_future = get_audio_executor().submit(
+                generate_and_update_audio, audio_generator,
+                st.session_state.question_store, current_question, question_id
+            )
+            st.session_state.pending_audio = (current_question, audio_future)
             
-                # Update session state
-                st.session_state.current_question = current_question
-                st.session_state.current_question['audio_file'] = audio_file
-                st.session_state.answered = False
-                st.session_state.button_state = "check"
-                    
-                # Show debug window
-                question_data = {
-                    'context': context,
-                    'question': current_question,
-                    'audio_file': audio_file,
-                    'question_id': question_id
-                } 
-                render_debug_window(question_data)
-            else:
-                st.error("Failed to generate audio for the question")
+            # Update session state
+            st.session_state.current_question = current_question
+            st.session_state.answered = False
+            st.session_state.button_state = "check"
+                
+            # Show debug window
+            question_data = {
+                'context': context,
+                'question': current_question,
+                'audio_file': None,
+                'question_id': question_id
+            } 
+            render_debug_window(question_data)
     
     col1, col2 = st.columns([2, 1])
     
     with col1:
         st.subheader("Practice Scenario")
         if "current_question" in st.session_state and st.session_state.current_question:
+            # Generate the next question while the user answers this one
+            prefetch_next_question(context)
            
             # Display introduction and conversation
             st.write("**Situation:**")
@@ -165,14 +266,14 @@ def render_interactive_learning():
             st.write("**Question:**")
             st.write(st.session_state.current_question.get("question", ""))
             
-            # Randomly shuffle options
-            if "shuffled_options" not in st.session_state or st.session_state.get("last_question") != st.session_state.current_question.get("question", ""):
+            # Options are shuffled once when the question is saved; questions saved
+            # before that get their order fixed here, once per load
+            if "shuffled_options" not in st.session_state.current_question:
                 options = st.session_state.current_question.get("options", []).copy()
                 random.shuffle(options)
-                st.session_state.shuffled_options = options
-                st.session_state.last_question = st.session_state.current_question.get("question", "")
+                st.session_state.current_question["shuffled_options"] = options
             
-            selected = st.radio("Choose your answer:", st.session_state.shuffled_options)
+            selected = st.radio("Choose your answer:", st.session_state.current_question["shuffled_options"])
             
             # Add space after radio buttons
             st.write("")
@@ -187,13 +288,11 @@ def render_interactive_learning():
                     if st.session_state.correct:
                         st.session_state.button_state = "next"
                 else:
-                    # Generate new question logic
+                    # Use the question prefetched while this one was being answered
                     question_type = 4  # Default to type 4 for dialogue practice
-                    generated_content = question_generator.generate_question_json(question_type, context)
-                    if generated_content and "generated_question" in generated_content:
-                        st.session_state.current_question = generated_content["generated_question"][0]
-                        # Save the new question
-                        st.session_state.question_store.save_question(context, st.session_state.current_question)
+                    next_question = take_next_question(context, question_type)
+                    if next_question:
+                        st.session_state.current_question = next_question
                         st.session_state.answered = False
                         st.session_state.button_state = "check"
                 st.rerun()
@@ -224,10 +323,23 @@ def render_interactive_learning():
             # Get the audio file path from the question data
             audio_file = st.session_state.current_question.get("audio_file", "")
             
+            # Audio still being generated for this question: wait for it here, after the
+            # question itself has already been rendered
+            pending_question, audio_future = st.session_state.get('pending_audio', (None, None))
+            if not audio_file and pending_question is st.session_state.current_question:
+                with st.spinner("Generating audio..."):
+                    try:
+                        audio_file = audio_future.result()
+                    except Exception:
+                        logger.exception("Error generating audio")
+                        audio_file = None
+                del st.session_state.pending_audio
+                if not audio_file:
+                    st.error("Failed to generate audio for the question")
+            
             if audio_file and os.path.exists(audio_file):
-                # Display audio player
-                audio_bytes = open(audio_file, 'rb').read()
-                st.audio(audio_bytes, format='audio/mp3')
+                # Display audio player; Streamlit serves the file from its media endpoint
+                st.audio(audio_file, format='audio/mp3')
             else:
                 st.warning("Audio file not found")
         else:
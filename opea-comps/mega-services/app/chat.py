@@ -8,6 +8,7 @@ from comps.cores.proto.api_protocol import (
     UsageInfo,
 )
 from fastapi import Request
+from fastapi.responses import ORJSONResponse
 
 class Chat:
     def __init__(self):
@@ -16,6 +17,27 @@ class Chat:
         self.endpoint = "/v1/chat/bootcamp"
         self.host = "0.0.0.0"
         self.port = 8888
+        # Built and validated once; each request dumps it to a fresh dict
+        self._response_template = ChatCompletionResponse(
+            id="1234567890",
+            object="chat.completion",
+            created=1677662400,
+            model="gpt-3.5-turbo",
+            choices=[
+                {
+                    "index": 0,
+                    "message": {
+                        "role": "assistant",
+                        "content": "Hello, how can I help you today?"
+                    }
+                }
+            ],
+            usage=UsageInfo(
+                prompt_tokens=100,
+                completion_tokens=100,
+                total_tokens=200
+            )
+        )
 
     def add_remote_service(self):
         print("Adding remote service")
@@ -37,28 +59,9 @@ class Chat:
 
         self.service.start()
 
-    def handle_request(self, request):
+    async def handle_request(self, request):
         print("Handling chat request")
-        return ChatCompletionResponse(
-            id="1234567890",
-            object="chat.completion",
-            created=1677662400,
-            model="gpt-3.5-turbo",
-            choices=[
-                {
-                    "index": 0,
-                    "message": {
-                        "role": "assistant",
-                        "content": "Hello, how can I help you today?"
-                    }
-                }
-            ],
-            usage=UsageInfo(
-                prompt_tokens=100,
-                completion_tokens=100,
-                total_tokens=200
-            )
-        )
+        return ORJSONResponse(content=self._response_template.model_dump())
 
 if __name__ == "__main__":
     chat = Chat()
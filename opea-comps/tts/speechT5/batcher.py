@@ -0,0 +1,72 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+# Concurrent requests are grouped into one model call: up to MAX_BATCH_SIZE requests,
+# waiting at most MAX_BATCH_WAIT seconds after the first one arrives
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "8"))
+MAX_BATCH_WAIT = float(os.getenv("MAX_BATCH_WAIT_MS", "20")) / 1000
+
+class Batcher:
+    """Runs requests submitted from any thread through batch_fn in groups, on one worker thread"""
+
+    def __init__(self, batch_fn, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, item):
+        """Queue an item; the returned Future resolves to its result"""
+        future = Future()
+        self.requests.put((item, future))
+        return future
+
+    def _next_request(self, timeout=None):
+        """Return the next queued request whose caller is still waiting, marking its future as running.
+
+        Futures cancelled meanwhile (e.g. by asyncio.wrap_future when a client disconnects) are dropped.
+        """
+        while True:
+            item, future = self.requests.get(timeout=timeout)
+            if future.set_running_or_notify_cancel():
+                return item, future
+
+    def _next_batch(self):
+        batch = [self._next_request()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._next_request(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _resolve(future, result=None, exception=None):
+        """Set a future's outcome; a future that can no longer take one is skipped, never ending the worker"""
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    self._resolve(future, exception=e)
+                continue
+            for (_, future), result in zip(batch, results):
+                self._resolve(future, result)
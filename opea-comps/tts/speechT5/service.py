@@ -1,61 +1,195 @@
 from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import torch
 import torchaudio
+import asyncio
+import functools
 import io
+import os
+import struct
+import threading
 import numpy as np
 import uvicorn
 from transformers import SpeechT5Processor, SpeechT5ForTextToSpeech, SpeechT5ForSpeechToText
 from transformers import SpeechT5HifiGan
 
+from batcher import Batcher
+from vocoding import vocode_overlapped
+
 app = FastAPI()
 
-# Load models
-processor = SpeechT5Processor.from_pretrained("microsoft/speecht5_tts")
-tts_model = SpeechT5ForTextToSpeech.from_pretrained("microsoft/speecht5_tts") 
-vocoder = SpeechT5HifiGan.from_pretrained("microsoft/speecht5_hifigan")
-stt_model = SpeechT5ForSpeechToText.from_pretrained("microsoft/speecht5_asr")
+# Run on the GPU in half precision when one is available; CPU stays in float32
+device = "cuda" if torch.cuda.is_available() else "cpu"
+dtype = torch.float16 if device == "cuda" else torch.float32
 
-# Speaker embeddings for TTS (pre-computed)
-speaker_embeddings = torch.randn(1, 512)  # This is just a placeholder
+def load_once(load):
+    """Call load on first use only, even when several requests arrive at once, and reuse its result"""
+    lock = threading.Lock()
+    result = []
 
-@app.post("/tts")
-async def text_to_speech(text: str):
-    inputs = processor(text=text, return_tensors="pt")
-    
-    # Generate speech
-    speech = tts_model.generate_speech(
-        inputs["input_ids"], 
-        speaker_embeddings, 
-        vocoder=vocoder
+    @functools.wraps(load)
+    def get():
+        if not result:
+            with lock:
+                if not result:
+                    result.append(load())
+        return result[0]
+    return get
+
+# Models are loaded on first use, so a deployment that only calls /tts never holds the STT weights
+@load_once
+def get_processor():
+    return SpeechT5Processor.from_pretrained("microsoft/speecht5_tts")
+
+@load_once
+def get_tts_model():
+    return SpeechT5ForTextToSpeech.from_pretrained("microsoft/speecht5_tts").to(device, dtype).eval()
+
+@load_once
+def get_vocoder():
+    vocoder = SpeechT5HifiGan.from_pretrained("microsoft/speecht5_hifigan").to(device, dtype).eval()
+    # On GPU, compile the vocoder with Inductor and CUDA graphs (TORCH_COMPILE=0 to disable).
+    # It always sees fixed-size chunks, so it compiles once; the autoregressive TTS decoder
+    # changes shape every step and stays eager.
+    if device == "cuda" and os.getenv("TORCH_COMPILE", "1") == "1":
+        vocoder = torch.compile(vocoder, mode="reduce-overhead")
+    return vocoder
+
+@load_once
+def get_stt_model():
+    return SpeechT5ForSpeechToText.from_pretrained("microsoft/speecht5_asr").to(device, dtype).eval()
+
+# Speaker x-vector, kept on the model cache volume so it is computed only once
+SPEAKER_EMBEDDINGS_PATH = os.getenv("SPEAKER_EMBEDDINGS_PATH", "/home/user/models/spk_xvec.pt")
+# CMU ARCTIC speaker used in the SpeechT5 examples
+SPEAKER_XVECTOR_INDEX = 7306
+
+def load_speaker_embeddings():
+    """Load the saved speaker x-vector, extracting it from CMU ARCTIC on first start"""
+    if os.path.exists(SPEAKER_EMBEDDINGS_PATH):
+        return torch.load(SPEAKER_EMBEDDINGS_PATH, map_location="cpu")
+    from datasets import load_dataset
+    xvectors = load_dataset("Matthijs/cmu-arctic-xvectors", split="validation")
+    embeddings = torch.tensor(xvectors[SPEAKER_XVECTOR_INDEX]["xvector"]).unsqueeze(0)
+    os.makedirs(os.path.dirname(SPEAKER_EMBEDDINGS_PATH), exist_ok=True)
+    torch.save(embeddings, SPEAKER_EMBEDDINGS_PATH)
+    return embeddings
+
+# Speaker embeddings for TTS, loaded once and kept on the device for every request
+@load_once
+def get_speaker_embeddings():
+    return load_speaker_embeddings().to(device, dtype)
+
+SAMPLE_RATE = 16000
+# Mel spectrogram frames vocoded per streamed audio chunk
+VOCODER_CHUNK_FRAMES = 64
+# Frames of context vocoded on each side of a chunk and trimmed off, so chunk boundaries don't click
+VOCODER_OVERLAP_FRAMES = int(os.getenv("VOCODER_OVERLAP_FRAMES", "8"))
+
+def wav_header(sample_rate, bits_per_sample=16, channels=1):
+    """WAV header for a stream whose length is not known up front (sizes set to the maximum)"""
+    block_align = channels * bits_per_sample // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 0xFFFFFFFF, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, bits_per_sample,
+        b"data", 0xFFFFFFFF
     )
+
+# Every TTS response has the same format, so its header is built once
+WAV_STREAM_HEADER = wav_header(SAMPLE_RATE)
+
+def synthesize_batch(texts):
+    """Generate one mel spectrogram per text in a single padded forward pass"""
+    inputs = get_processor()(text=texts, padding=True, return_tensors="pt")
+    with torch.inference_mode():
+        spectrograms, lengths = get_tts_model().generate_speech(
+            inputs["input_ids"].to(device),
+            get_speaker_embeddings().expand(len(texts), -1),
+            attention_mask=inputs["attention_mask"].to(device),
+            return_output_lengths=True
+        )
+    # Trim each spectrogram back to its own length
+    return [spectrogram[:length] for spectrogram, length in zip(spectrograms, lengths)]
+
+def transcribe_batch(waveforms):
+    """Transcribe 16kHz waveforms in a single padded forward pass"""
+    processor = get_processor()
+    inputs = processor(audio=waveforms, sampling_rate=16000, padding="longest", return_tensors="pt")
+    input_values = inputs["input_values"]
+    attention_mask = inputs["attention_mask"]
+    if device == "cuda":
+        # Stage in pinned memory so the copies to the GPU are asynchronous
+        input_values = input_values.pin_memory()
+        attention_mask = attention_mask.pin_memory()
+    with torch.inference_mode():
+        predicted_ids = get_stt_model().generate(
+            input_values.to(device, non_blocking=True).to(dtype),
+            attention_mask=attention_mask.to(device, non_blocking=True),
+            num_beams=1
+        )
+    return processor.batch_decode(predicted_ids, skip_special_tokens=True)
+
+def vocode_chunks(chunks):
+    """Vocode spectrogram chunks one at a time, always on the batcher's single thread.
+
+    The compiled vocoder replays CUDA graphs, which are not safe to run from several threads,
+    and each replay overwrites the previous output, so every waveform is cloned.
+    """
+    vocoder = get_vocoder()
+    with torch.inference_mode():
+        return [vocoder(chunk).clone() for chunk in chunks]
+
+tts_batcher = Batcher(synthesize_batch)
+stt_batcher = Batcher(transcribe_batch)
+# Streams run in Starlette's threadpool; their vocoder calls are funnelled through one thread.
+# Chunks go out as soon as they arrive rather than waiting to be grouped
+vocoder_batcher = Batcher(vocode_chunks, max_wait=0)
+
+def stream_speech(spectrogram):
+    """Yield a WAV header, then 16-bit PCM for each chunk of the spectrogram as it is vocoded"""
+    yield WAV_STREAM_HEADER
+    vocode = lambda chunk: vocoder_batcher.submit(chunk).result()
+    with torch.inference_mode():
+        for waveform in vocode_overlapped(spectrogram, vocode, VOCODER_CHUNK_FRAMES, VOCODER_OVERLAP_FRAMES):
+            pcm = (waveform.float().clamp(-1.0, 1.0) * 32767).to(torch.int16)
+            yield pcm.cpu().numpy().tobytes()
+
+@app.post("/tts")
+def text_to_speech(text: str):
+    # Generate the mel spectrogram together with other pending requests;
+    # the vocoder runs chunk by chunk while the response streams
+    spectrogram = tts_batcher.submit(text).result()
     
-    # Convert to bytes
-    buffer = io.BytesIO()
-    torchaudio.save(buffer, speech.unsqueeze(0), 16000, format="wav")
-    buffer.seek(0)
+    return StreamingResponse(stream_speech(spectrogram), media_type="audio/wav")
+
+def load_waveform(contents):
+    """Decode an uploaded audio file to a 16kHz waveform as a numpy array (shares the tensor's memory)"""
+    waveform, sample_rate = torchaudio.load(io.BytesIO(contents))
     
-    return JSONResponse(content={"status": "success"})
+    # Resample if needed
+    if sample_rate != 16000:
+        waveform = torchaudio.functional.resample(waveform, sample_rate, 16000)
+    return waveform.squeeze().numpy()
 
 @app.post("/stt")
 async def speech_to_text(file: UploadFile = File(...)):
     contents = await file.read()
     
-    # Convert to audio tensor
-    buffer = io.BytesIO(contents)
-    waveform, sample_rate = torchaudio.load(buffer)
+    # Process through model, batched with other pending requests
+    transcription = await asyncio.wrap_future(stt_batcher.submit(load_waveform(contents)))
     
-    # Resample if needed
-    if sample_rate != 16000:
-        resampler = torchaudio.transforms.Resample(sample_rate, 16000)
-        waveform = resampler(waveform)
+    return JSONResponse(content={"transcription": transcription})
+
+@app.post("/stt/batch")
+async def speech_to_text_batch(files: list[UploadFile] = File(...)):
+    contents = await asyncio.gather(*(file.read() for file in files))
     
-    # Process through model
-    inputs = processor(audio=waveform.squeeze().numpy(), sampling_rate=16000, return_tensors="pt")
-    predicted_ids = stt_model.generate(inputs["input_values"])
-    transcription = processor.batch_decode(predicted_ids, skip_special_tokens=True)
+    # All clips are queued at once, so the batcher packs them into as few forward passes as possible
+    futures = [stt_batcher.submit(load_waveform(data)) for data in contents]
+    transcriptions = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
     
-    return JSONResponse(content={"transcription": transcription[0]})
+    return JSONResponse(content={"transcriptions": list(transcriptions)})
 
 @app.get("/health")
 def health_check():
@@ -0,0 +1,56 @@
+"""
+Tests for the request batcher shared by the SpeechT5 endpoints.
+"""
+import threading
+import unittest
+
+from batcher import Batcher
+
+
+class TestBatcher(unittest.TestCase):
+    """Test cases for Batcher."""
+
+    def test_results_in_order(self):
+        """Test that each future resolves to the result for its own item."""
+        batcher = Batcher(lambda items: [item * 2 for item in items], max_wait=0.01)
+        futures = [batcher.submit(i) for i in range(5)]
+        self.assertEqual([future.result(timeout=5) for future in futures], [0, 2, 4, 6, 8])
+
+    def test_cancelled_future_does_not_stop_worker(self):
+        """Test that a request cancelled while queued is skipped and later requests still resolve."""
+        started = threading.Event()
+        release = threading.Event()
+        seen = []
+
+        def batch_fn(items):
+            seen.extend(items)
+            started.set()
+            release.wait(5)
+            return items
+
+        batcher = Batcher(batch_fn, max_batch_size=1, max_wait=0)
+        first = batcher.submit("first")
+        self.assertTrue(started.wait(5))
+        # Queued behind the running batch, then abandoned by its caller
+        cancelled = batcher.submit("cancelled")
+        self.assertTrue(cancelled.cancel())
+        release.set()
+
+        self.assertEqual(first.result(timeout=5), "first")
+        self.assertEqual(batcher.submit("later").result(timeout=5), "later")
+        self.assertNotIn("cancelled", seen)
+
+    def test_batch_error_reaches_every_caller(self):
+        """Test that an exception from batch_fn is set on the futures and the worker keeps running."""
+        def batch_fn(items):
+            if "bad" in items:
+                raise ValueError("boom")
+            return items
+
+        batcher = Batcher(batch_fn, max_batch_size=1, max_wait=0)
+        with self.assertRaises(ValueError):
+            batcher.submit("bad").result(timeout=5)
+        self.assertEqual(batcher.submit("good").result(timeout=5), "good")
+
+if __name__ == '__main__':
+    unittest.main()
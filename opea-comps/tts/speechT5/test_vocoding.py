@@ -0,0 +1,65 @@
+"""
+Tests for overlapped chunk vocoding.
+"""
+import unittest
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+HOP_LENGTH = 4
+
+def make_vocoder(bins=8, kernel_size=5):
+    """A stand-in vocoder: one convolution over time, then each frame upsampled to HOP_LENGTH samples"""
+    torch.manual_seed(0)
+    conv = torch.nn.Conv1d(bins, 1, kernel_size, padding=kernel_size // 2)
+
+    def vocode(spectrogram):
+        with torch.no_grad():
+            frames = conv(spectrogram.T.unsqueeze(0))[0, 0]
+        return torch.tanh(frames).repeat_interleave(HOP_LENGTH)
+
+    return vocode
+
+
+@unittest.skipIf(torch is None, "torch is not installed")
+class TestVocodeOverlapped(unittest.TestCase):
+    """Test cases for vocode_overlapped."""
+
+    def setUp(self):
+        from vocoding import vocode_overlapped
+        self.vocode_overlapped = vocode_overlapped
+        self.vocode = make_vocoder()
+        self.spectrogram = torch.randn(150, 8)
+
+    def chunked(self, overlap_frames):
+        return torch.cat(list(self.vocode_overlapped(self.spectrogram, self.vocode, 64, overlap_frames)))
+
+    def test_matches_whole_spectrogram(self):
+        """Test that chunks vocoded with overlap join into the whole-spectrogram waveform."""
+        whole = self.vocode(self.spectrogram)
+        chunked = self.chunked(overlap_frames=4)
+        self.assertEqual(chunked.shape, whole.shape)
+        self.assertTrue(torch.allclose(chunked, whole, atol=1e-6))
+
+    def test_no_overlap_differs_at_boundaries(self):
+        """Test that chunks vocoded without context do not match at the chunk boundaries."""
+        whole = self.vocode(self.spectrogram)
+        chunked = self.chunked(overlap_frames=0)
+        self.assertEqual(chunked.shape, whole.shape)
+        self.assertFalse(torch.allclose(chunked, whole, atol=1e-6))
+
+    def test_fixed_input_size(self):
+        """Test that every vocoder call gets the same number of frames, including the last chunk."""
+        sizes = []
+
+        def vocode(chunk):
+            sizes.append(chunk.shape[0])
+            return self.vocode(chunk)
+
+        list(self.vocode_overlapped(self.spectrogram, vocode, 64, 4))
+        self.assertEqual(sizes, [72, 72, 72])
+
+if __name__ == '__main__':
+    unittest.main()
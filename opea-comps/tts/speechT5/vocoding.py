@@ -0,0 +1,21 @@
+import torch
+
+def vocode_overlapped(spectrogram, vocode, chunk_frames, overlap_frames):
+    """Vocode a (frames, bins) spectrogram chunk by chunk, yielding each chunk's waveform.
+
+    Every chunk is vocoded with overlap_frames of its neighbours on either side, so the vocoder
+    sees the same context at chunk edges as it would for the whole spectrogram, and the samples
+    for that context are trimmed off again; without it each boundary clicks. The spectrogram is
+    zero-padded at both ends so every vocoder input has the same chunk_frames + 2 * overlap_frames
+    frames, and the samples for padded frames are dropped.
+    """
+    total = spectrogram.shape[0]
+    window_frames = chunk_frames + 2 * overlap_frames
+    padded = torch.nn.functional.pad(
+        spectrogram, (0, 0, overlap_frames, overlap_frames + (-total) % chunk_frames)
+    )
+    for start in range(0, total, chunk_frames):
+        frames = min(chunk_frames, total - start)
+        waveform = vocode(padded[start:start + window_frames])
+        hop = waveform.shape[-1] // window_frames
+        yield waveform[overlap_frames * hop:(overlap_frames + frames) * hop]
@@ -1,13 +1,22 @@
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
+import asyncio
 import json
 import os
 
 # Get the model name from environment or use default
 MODEL_NAME = os.environ.get("MODEL_NAME", "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+COMPLETIONS_URL = "http://localhost:8000/v1/completions"
+
+# One keep-alive session reused by every call, so each request skips the TCP handshake
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=32))
+SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32))
 
 def chat_with_llm(prompt, max_tokens=150):
-    response = requests.post(
-        "http://localhost:8000/v1/completions",
+    response = SESSION.post(
+        COMPLETIONS_URL,
         json={
             "model": MODEL_NAME,
             "prompt": prompt,
@@ -19,6 +28,60 @@ def chat_with_llm(prompt, max_tokens=150):
     result = response.json()
     return result['choices'][0]['text']
 
+def chat_many(prompts, max_tokens=150):
+    """Send every prompt in one request so vLLM schedules them as one batch; replies are in prompt order"""
+    response = SESSION.post(
+        COMPLETIONS_URL,
+        json={
+            "model": MODEL_NAME,
+            "prompt": list(prompts),
+            "max_tokens": max_tokens,
+            "temperature": 0.7
+        }
+    )
+    
+    result = response.json()
+    return [choice['text'] for choice in sorted(result['choices'], key=lambda choice: choice['index'])]
+
+def stream_chat_with_llm(prompt, max_tokens=150):
+    """Yield the completion text as vLLM streams it, chunk by chunk"""
+    with SESSION.post(
+        COMPLETIONS_URL,
+        json={
+            "model": MODEL_NAME,
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+            "stream": True
+        },
+        stream=True
+    ) as response:
+        # Server-sent events: one "data: {...}" line per chunk, ending with "data: [DONE]"
+        for line in response.iter_lines():
+            if not line.startswith(b"data: "):
+                continue
+            data = line[len(b"data: "):]
+            if data == b"[DONE]":
+                break
+            yield json.loads(data)['choices'][0]['text']
+
+async def chat_batch(prompts, max_tokens=150):
+    """Send all prompts concurrently over one connection pool and return the replies in order"""
+    async with httpx.AsyncClient(timeout=None) as client:
+        async def complete(prompt):
+            response = await client.post(
+                COMPLETIONS_URL,
+                json={
+                    "model": MODEL_NAME,
+                    "prompt": prompt,
+                    "max_tokens": max_tokens,
+                    "temperature": 0.7
+                }
+            )
+            return response.json()['choices'][0]['text']
+
+        return await asyncio.gather(*(complete(prompt) for prompt in prompts))
+
 if __name__ == "__main__":
     print(f"Chat with {MODEL_NAME} (type 'exit' to quit)")
     print("-----------------------------------")
@@ -28,5 +91,8 @@ if __name__ == "__main__":
         if user_input.lower() == 'exit':
             break
             
-        response = chat_with_llm(user_input)
-        print(f"\nAI: {response}")
\ No newline at end of file
+        # Print tokens as they arrive instead of waiting for the whole reply
+        print("\nAI: ", end="", flush=True)
+        for text in stream_chat_with_llm(user_input):
+            print(text, end="", flush=True)
+        print()
@@ -3,21 +3,44 @@ ReAct agent implementation for the vocabulary generator.
 """
 from typing import Dict, Any, Optional, List, Tuple
 import re
+import copy
+import functools
 import json
 import logging
+import httpx
 from ollama import Client
 
+# orjson parses the LLM output and serializes tool observations noticeably faster;
+# the standard library is the fallback
+try:
+    import orjson
+    _loads = orjson.loads
+
+    def _dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    _loads = json.loads
+    _dumps = functools.partial(json.dumps, ensure_ascii=False)
+
 from app.agent.prompt import get_prompt
 from app.tools.get_lyrics import get_lyrics
 from app.tools.extract_vocab import extract_vocabulary
 from app.tools.return_vocab import return_vocabulary
 from app.tools.vocab_cache import get_cached_vocab, save_vocab_to_cache
+from app.agent.semantic_cache import semantic_cache, semantic_cache_key
 
 # Initialize logging
 logger = logging.getLogger(__name__)
 
-# Initialize the Ollama client
-client = Client(host="http://localhost:11434")
+# Initialize the Ollama client. It wraps one httpx.Client for the life of the process,
+# so every agent iteration reuses a kept-alive connection instead of opening a new one
+client = Client(
+    host="http://localhost:11434",
+    limits=httpx.Limits(max_connections=4, max_keepalive_connections=4)
+)
+
+# System message that opens every conversation
+SYSTEM_MESSAGE = {"role": "system", "content": "You are a helpful Japanese language learning assistant."}
 
 # Define the model name
 MODEL_NAME = "mistral:7b"
@@ -29,30 +52,319 @@ TOOLS = {
     "return_vocabulary": return_vocabulary
 }
 
+# Patterns for parsing LLM responses, compiled once at import time
+_THOUGHT_RE = re.compile(r"Thought:(.*?)(?:Action:|Final Answer:)", re.DOTALL)
+_ACTION_RE = re.compile(r"Action:(.*?)(?:Action Input:)", re.DOTALL)
+_ACTION_INPUT_RE = re.compile(r"Action Input:(.*?)(?:Observation:|$)", re.DOTALL)
+_FINAL_ANSWER_RE = re.compile(r"Final Answer:(.*?)$", re.DOTALL)
+_SINGLE_QUOTE_KEY_RE = re.compile(r"'([^']*)'\s*:")
+_UNQUOTED_KEY_RE = re.compile(r"([{,])\s*(\w+)\s*:")
+_TRAILING_COMMA_RE = re.compile(r',\s*([\]\}])')
+# One vocabulary line: [number.] word [(romaji)] - meaning, with ":" also accepted as the separator
+_VOCAB_LINE_RE = re.compile(
+    r'^[ \t]*(?:\d+\.[ \t]+)?'
+    r'(?P<word>[^(:\n]+?)[ \t]*'
+    r'(?:\((?P<romaji>[^)\n]+)\)[^:\n]*?)?'
+    r'[ \t]*(?: - |:)[ \t]*(?P<meaning>[^\n]*?\S)[ \t]*$',
+    re.MULTILINE
+)
+_VOCAB_OBJ_RE = re.compile(r'\{[^\{\}]*"vocabulary"[^\{\}]*\}')
+# "(romaji) - english" following a Japanese word, matched from its opening parenthesis
+_READING_RE = re.compile(r'[\(（]([\w\s]+)[\)）]\s*[-–—]\s*([\w\s]+)')
+
+# Lookup table of Japanese code points: hiragana, katakana and CJK unified ideographs
+_JAPANESE_CHARS = bytearray(0x10000)
+for _low, _high in ((0x3040, 0x30A0), (0x30A0, 0x3100), (0x4E00, 0x9FB0)):
+    _JAPANESE_CHARS[_low:_high] = b"\x01" * (_high - _low)
+
+# Accepted source keys for each vocabulary field, in order of preference, and the value used when none is present
+_VOCAB_KEY_ALIASES = {
+    "kanji": (("kanji", "word"), "Unknown"),
+    "romaji": (("romaji", "pronunciation"), ""),
+    "english": (("english", "meaning", "translation"), "Unknown"),
+}
+
+# Music-related words used to pad a manually extracted vocabulary list up to 5 items
+_DEFAULT_VOCAB_ITEMS = (
+    {
+        "kanji": "音楽",
+        "romaji": "ongaku",
+        "english": "music",
+        "parts": [
+            {"kanji": "音", "romaji": ["on"]},
+            {"kanji": "楽", "romaji": ["ga", "ku"]}
+        ]
+    },
+    {
+        "kanji": "歌",
+        "romaji": "uta",
+        "english": "song",
+        "parts": [
+            {"kanji": "歌", "romaji": ["u", "ta"]}
+        ]
+    },
+    {
+        "kanji": "感情",
+        "romaji": "kanjou",
+        "english": "emotion",
+        "parts": [
+            {"kanji": "感", "romaji": ["kan"]},
+            {"kanji": "情", "romaji": ["jou"]}
+        ]
+    },
+    {
+        "kanji": "愛",
+        "romaji": "ai",
+        "english": "love",
+        "parts": [
+            {"kanji": "愛", "romaji": ["ai"]}
+        ]
+    },
+    {
+        "kanji": "悲しみ",
+        "romaji": "kanashimi",
+        "english": "sadness",
+        "parts": [
+            {"kanji": "悲", "romaji": ["ka", "na"]},
+            {"kanji": "し", "romaji": ["shi"]},
+            {"kanji": "み", "romaji": ["mi"]}
+        ]
+    }
+)
+
+def _find_json_objects(text: str) -> List[str]:
+    """
+    Find the top-level {...} spans in a string with a single linear scan.
+    
+    Braces inside JSON string literals are ignored.
+    
+    Args:
+        text: The string to scan
+    
+    Returns:
+        The balanced object spans, in order of appearance
+    """
+    objects = []
+    depth = 0
+    start = -1
+    in_string = False
+    escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif char == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                objects.append(text[start:i + 1])
+    return objects
+
+def _longest_first(candidates: List[str]):
+    """
+    Yield the longest candidate, then the others from longest to shortest.
+    
+    The others are only sorted once a caller asks for more than the first, which a
+    well-formed response never needs.
+    
+    Args:
+        candidates: A non-empty list of strings
+    
+    Yields:
+        The candidates, longest first
+    """
+    longest = max(range(len(candidates)), key=lambda i: len(candidates[i]))
+    yield candidates[longest]
+    rest = candidates[:longest] + candidates[longest + 1:]
+    rest.sort(key=len, reverse=True)
+    yield from rest
+
+def _iter_kv_triples(text: str):
+    """
+    Yield each run of three consecutive key: "value" pairs in a string, scanning it once.
+    
+    Keys may be quoted or bare words; a pair is only joined to the previous one when
+    they are separated by nothing but commas, quotes and whitespace.
+    
+    Args:
+        text: The string to scan
+    
+    Yields:
+        Tuples of three (key, value) pairs
+    """
+    pairs = []
+    pos = 0
+    while True:
+        colon = text.find(":", pos)
+        if colon == -1:
+            return
+        # The key is the word just before the colon, optionally quoted
+        end = colon
+        while end > pos and text[end - 1].isspace():
+            end -= 1
+        if end > pos and text[end - 1] == '"':
+            end -= 1
+        start = end
+        while start > pos and (text[start - 1].isalnum() or text[start - 1] == "_"):
+            start -= 1
+        # Anything but separators since the last pair starts a new run
+        if text[pos:start].strip(' \t\r\n,"'):
+            pairs = []
+        # The value must be a non-empty double-quoted string
+        value_start = colon + 1
+        while value_start < len(text) and text[value_start].isspace():
+            value_start += 1
+        if value_start >= len(text) or text[value_start] != '"':
+            pairs = []
+            pos = colon + 1
+            continue
+        value_end = text.find('"', value_start + 1)
+        if value_end == -1:
+            return
+        pos = value_end + 1
+        key, value = text[start:end], text[value_start + 1:value_end]
+        if not key or not value:
+            pairs = []
+            continue
+        pairs.append((key, value))
+        if len(pairs) == 3:
+            yield tuple(pairs)
+            pairs = []
+
+def _kv_triple_entry(triple: Tuple[Tuple[str, str], ...]) -> Tuple[str, str, str]:
+    """
+    Map a triple of (key, value) pairs to (kanji, romaji, english) by the key names.
+    
+    Args:
+        triple: Pairs from _iter_kv_triples
+    
+    Returns:
+        A (kanji, romaji, english) tuple, with "" for any field not found
+    """
+    kanji, romaji, english = "", "", ""
+    for key, val in triple:
+        key = key.lower()
+        if "kanji" in key or "word" in key or "japanese" in key:
+            kanji = val
+        elif "romaji" in key or "pronunciation" in key or "reading" in key:
+            romaji = val
+        elif "english" in key or "translation" in key or "meaning" in key:
+            english = val
+    return kanji, romaji, english
+
+def _iter_direct_matches(text: str):
+    """
+    Yield (kanji, romaji, english) for each "日本語 (romaji) - english" in a string.
+    
+    Only the text around each opening parenthesis is examined: the Japanese word is
+    found by walking back from it through the code point table.
+    
+    Args:
+        text: The string to scan
+    
+    Yields:
+        Tuples of (kanji, romaji, english)
+    """
+    pos = 0
+    while True:
+        parens = [i for i in (text.find("(", pos), text.find("（", pos)) if i != -1]
+        if not parens:
+            return
+        paren = min(parens)
+        end = paren
+        while end > pos and text[end - 1].isspace():
+            end -= 1
+        start = end
+        while start > pos and ord(text[start - 1]) < 0x10000 and _JAPANESE_CHARS[ord(text[start - 1])]:
+            start -= 1
+        match = _READING_RE.match(text, paren) if start < end else None
+        if match is None:
+            pos = paren + 1
+            continue
+        yield text[start:end], match.group(1), match.group(2)
+        pos = match.end()
+
+def _fast_parse_final_answer(response: str) -> Optional[Tuple[Optional[str], None, None, Any]]:
+    """
+    Parse the common response shape, a thought and a final answer that is exactly one JSON object,
+    with string searches only.
+    
+    Args:
+        response: The raw LLM response
+    
+    Returns:
+        The same tuple as parse_llm_response, or None when the response needs the full parser
+    """
+    if "Action Input:" in response:
+        return None
+    marker = response.find("Final Answer:")
+    if marker == -1:
+        return None
+    answer = response[marker + len("Final Answer:"):].replace('```json', '').replace('```', '').strip()
+    if not (answer.startswith("{") and answer.endswith("}")):
+        return None
+    try:
+        final_answer = _loads(answer)
+    except ValueError:
+        return None
+    
+    # Same as _THOUGHT_RE: the text between "Thought:" and the next "Action:" or "Final Answer:"
+    thought = None
+    start = response.find("Thought:")
+    if start != -1:
+        start += len("Thought:")
+        ends = [i for i in (response.find("Action:", start), response.find("Final Answer:", start)) if i != -1]
+        if ends:
+            thought = response[start:min(ends)].strip()
+    return thought, None, None, final_answer
+
 def parse_llm_response(response: str) -> Tuple[str, Optional[str], Optional[str], Optional[Dict]]:
     """
     Parse the LLM response to extract thought, action, action input, and final answer.
     
+    Repeated responses are parsed only once; each caller gets its own copy of the result.
+    
     Args:
         response: The raw LLM response
     
     Returns:
         A tuple of (thought, action, action_input, final_answer)
     """
+    return copy.deepcopy(_parse_llm_response(response))
+
+@functools.lru_cache(maxsize=256)
+def _parse_llm_response(response: str) -> Tuple[str, Optional[str], Optional[str], Optional[Dict]]:
+    """Parse an LLM response; results are cached and must not be modified"""
+    # Most responses are a thought followed by a clean JSON final answer
+    parsed = _fast_parse_final_answer(response)
+    if parsed is not None:
+        return parsed
+    
+    # Each regex only runs when its marker is present; the substring check is far cheaper
+    # than a DOTALL search over a long response
     # Extract thought
-    thought_match = re.search(r"Thought:(.*?)(?:Action:|Final Answer:)", response, re.DOTALL)
+    thought_match = _THOUGHT_RE.search(response) if "Thought:" in response else None
     thought = thought_match.group(1).strip() if thought_match else None
     
     # Extract action
-    action_match = re.search(r"Action:(.*?)(?:Action Input:)", response, re.DOTALL)
+    action_match = _ACTION_RE.search(response) if "Action Input:" in response else None
     action = action_match.group(1).strip() if action_match else None
     
     # Extract action input
-    action_input_match = re.search(r"Action Input:(.*?)(?:Observation:|$)", response, re.DOTALL)
+    action_input_match = _ACTION_INPUT_RE.search(response) if "Action Input:" in response else None
     action_input_str = action_input_match.group(1).strip() if action_input_match else None
     
     # Extract final answer
-    final_answer_match = re.search(r"Final Answer:(.*?)$", response, re.DOTALL)
+    final_answer_match = _FINAL_ANSWER_RE.search(response) if "Final Answer:" in response else None
     final_answer_str = final_answer_match.group(1).strip() if final_answer_match else None
     
     # Parse action input and final answer as JSON if possible
@@ -60,12 +372,12 @@ def parse_llm_response(response: str) -> Tuple[str, Optional[str], Optional[str]
     if action_input_str:
         # Clean up the action input string
         # Remove any markdown formatting that might be present
-        cleaned_input_str = re.sub(r'```json|```', '', action_input_str).strip()
+        cleaned_input_str = action_input_str.replace('```json', '').replace('```', '').strip()
         
         try:
             # First try to parse as JSON
-            action_input = json.loads(cleaned_input_str)
-        except json.JSONDecodeError:
+            action_input = _loads(cleaned_input_str)
+        except ValueError:
             # If not JSON, use as string
             action_input = action_input_str
     
@@ -73,218 +385,111 @@ def parse_llm_response(response: str) -> Tuple[str, Optional[str], Optional[str]
     if final_answer_str:
         # First, clean up the final answer string
         # Remove any markdown formatting that might be present
-        cleaned_str = re.sub(r'```json|```', '', final_answer_str)
+        cleaned_str = final_answer_str.replace('```json', '').replace('```', '')
         cleaned_str = cleaned_str.strip()
         
-        # Log the cleaned string for debugging
-        logger.info(f"Cleaned final answer string: {cleaned_str[:100]}...")
+        # Log the cleaned string for debugging; the check skips the slice when INFO is off
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Cleaned final answer string: %s...", cleaned_str[:100])
         
         try:
             # First try to parse as JSON
-            final_answer = json.loads(cleaned_str)
+            final_answer = _loads(cleaned_str)
             logger.info("Successfully parsed final answer as JSON")
-        except json.JSONDecodeError as e:
-            logger.info(f"JSON decode error: {str(e)}")
-            # If not JSON, try to extract JSON from the string
-            # First, try to fix common JSON formatting issues
-            fixed_str = cleaned_str
+        except ValueError as e:
+            logger.info("JSON decode error: %s", e)
+            # If not JSON, fix common formatting issues once over the whole string;
+            # the fixed string is reused for the candidate objects below
             # Replace single quotes with double quotes
-            fixed_str = re.sub(r"'([^']*)'\s*:", r'"\1":', fixed_str)
+            fixed_str = _SINGLE_QUOTE_KEY_RE.sub(r'"\1":', cleaned_str)
             # Fix missing quotes around keys
-            fixed_str = re.sub(r"([{,])\s*(\w+)\s*:", r'\1 "\2":', fixed_str)
+            fixed_str = _UNQUOTED_KEY_RE.sub(r'\1 "\2":', fixed_str)
+            # Fix trailing commas in arrays/objects
+            fixed_str = _TRAILING_COMMA_RE.sub(r'\1', fixed_str)
             
-            try:
-                # Try parsing with the fixed string
-                final_answer = json.loads(fixed_str)
-                logger.info("Successfully parsed fixed JSON")
-                return thought, action, action_input, final_answer
-            except json.JSONDecodeError:
-                logger.info("Failed to parse fixed JSON")
+            # Unless nothing needed fixing, in which case it already failed above
+            if fixed_str != cleaned_str:
+                try:
+                    # Try parsing with the fixed string
+                    final_answer = _loads(fixed_str)
+                    logger.info("Successfully parsed fixed JSON")
+                    return thought, action, action_input, final_answer
+                except ValueError:
+                    logger.info("Failed to parse fixed JSON")
             
-            # Look for the most complete JSON object in the string
-            json_matches = list(re.finditer(r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}", cleaned_str, re.DOTALL))
+            # Look for the most complete JSON object in the fixed string
+            json_matches = _find_json_objects(fixed_str)
             
             if json_matches:
                 # Try each match, starting with the longest one
-                json_matches.sort(key=lambda m: len(m.group(0)), reverse=True)
-                
-                for json_match in json_matches:
+                for potential_json in _longest_first(json_matches):
+                    # The whole string has already been tried
+                    if potential_json == fixed_str:
+                        continue
                     try:
-                        potential_json = json_match.group(0)
-                        logger.info(f"Trying to parse potential JSON: {potential_json[:100]}...")
-                        
-                        # Try to fix the potential JSON
-                        fixed_json = potential_json
-                        # Replace single quotes with double quotes
-                        fixed_json = re.sub(r"'([^']*)'\s*:", r'"\1":', fixed_json)
-                        # Fix missing quotes around keys
-                        fixed_json = re.sub(r"([{,])\s*(\w+)\s*:", r'\1 "\2":', fixed_json)
-                        # Fix trailing commas in arrays/objects
-                        fixed_json = re.sub(r',\s*([\]\}])', r'\1', fixed_json)
-                        
-                        try:
-                            final_answer = json.loads(fixed_json)
-                            logger.info("Successfully parsed fixed JSON match")
-                            break
-                        except json.JSONDecodeError:
-                            # If fixing didn't work, try the original
-                            final_answer = json.loads(potential_json)
-                            logger.info("Successfully parsed original JSON match")
-                            break
-                    except json.JSONDecodeError:
+                        if logger.isEnabledFor(logging.INFO):
+                            logger.info("Trying to parse potential JSON: %s...", potential_json[:100])
+                        final_answer = _loads(potential_json)
+                        logger.info("Successfully parsed JSON match")
+                        break
+                    except ValueError:
                         continue
             
             # If we still don't have valid JSON
             if final_answer is None:
                 # Try manual extraction of vocabulary items
                 if "vocabulary" in cleaned_str.lower() or "words" in cleaned_str.lower() or "kanji" in cleaned_str.lower():
-                    # Try to manually extract vocabulary items
-                    def extract_vocab_items(patterns):
-                        """Helper function to extract vocabulary items from regex patterns"""
-                        items = []
-                        for match in patterns:
-                            try:
-                                # Extract the keys and values
-                                key1, val1, key2, val2, key3, val3 = match.groups()
-                                
-                                # Determine which fields are which
-                                kanji, romaji, english = "", "", ""
-                                
-                                for key, val in [(key1, val1), (key2, val2), (key3, val3)]:
-                                    key = key.lower()
-                                    if "kanji" in key or "word" in key or "japanese" in key:
-                                        kanji = val
-                                    elif "romaji" in key or "pronunciation" in key or "reading" in key:
-                                        romaji = val
-                                    elif "english" in key or "translation" in key or "meaning" in key:
-                                        english = val
-                                
-                                # Make sure we don't add duplicates
-                                if (kanji or romaji or english) and not any(item.get('kanji') == kanji for item in items):
-                                    # Create parts array by splitting the kanji into individual characters
-                                    parts = []
-                                    for char in kanji:
-                                        # For simplicity, use the same romaji for each character
-                                        # In a real implementation, this would need more sophisticated logic
-                                        parts.append({
-                                            "kanji": char,
-                                            "romaji": [] # Empty array as placeholder, would need proper mapping
-                                        })
-                                    
-                                    items.append({
-                                        "kanji": kanji,
-                                        "romaji": romaji,
-                                        "english": english,
-                                        "parts": parts
-                                    })
-                            except Exception as e:
-                                logger.error(f"Error parsing vocabulary item: {str(e)}")
-                        return items
+                    # Kanji already added, for constant-time duplicate checks
+                    seen_kanji = set()
                     
-                    vocab_items = []
-                    
-                    # Look for patterns like {"word_kanji": "レモン", "word_romaji": "remon", "translation": "lemon"}
-                    # More flexible pattern to match various JSON formats
-                    word_patterns = re.finditer(r'[{\[]\s*"?(\w+)"?\s*:\s*"([^"]+)"\s*,\s*"?(\w+)"?\s*:\s*"([^"]+)"\s*,\s*"?(\w+)"?\s*:\s*"([^"]+)"', cleaned_str)
-                    
-                    # If we don't find enough vocabulary items with the first pattern, try a more lenient one
-                    vocab_items = list(extract_vocab_items(word_patterns))
+                    def extract_vocab_items(entries):
+                        """Helper generator turning (kanji, romaji, english) entries into new vocabulary items"""
+                        for kanji, romaji, english in entries:
+                            # Make sure we don't add duplicates
+                            if (kanji or romaji or english) and kanji not in seen_kanji:
+                                seen_kanji.add(kanji)
+                                # Create parts array by splitting the kanji into individual characters
+                                # Empty romaji arrays are placeholders; a real mapping would need more sophisticated logic.
+                                # Each part gets its own list, since the items are returned to callers
+                                yield {
+                                    "kanji": kanji,
+                                    "romaji": romaji,
+                                    "english": english,
+                                    "parts": [{"kanji": char, "romaji": []} for char in kanji]
+                                }
                     
-                    # If we found fewer than 5 items, try an alternative pattern
-                    if len(vocab_items) < 5:
-                        logger.info(f"First pattern only found {len(vocab_items)} items, trying alternative pattern")
-                        # Try to match JSON-like structures with different formatting - using a simpler pattern
-                        alt_patterns = re.finditer(r'[{\[]?\s*(\w+)\s*[:]\s*"([^"]+)"\s*,\s*(\w+)\s*[:]\s*"([^"]+)"\s*,\s*(\w+)\s*[:]\s*"([^"]+)"', cleaned_str)
-                        vocab_items.extend(extract_vocab_items(alt_patterns))
+                    # Look for patterns like {"word_kanji": "レモン", "word_romaji": "remon", "translation": "lemon"},
+                    # with quoted or bare keys
+                    vocab_items = list(extract_vocab_items(map(_kv_triple_entry, _iter_kv_triples(cleaned_str))))
                         
-                    # If we still don't have enough items, try to extract directly from the text
+                    # If we still don't have enough items, try to extract directly from the text;
+                    # the direct scan only runs when it is needed
                     if len(vocab_items) < 5:
-                        logger.info(f"Still only found {len(vocab_items)} items, trying direct extraction")
+                        logger.info("Still only found %d items, trying direct extraction", len(vocab_items))
                         # Try to find Japanese words and their translations directly
-                        direct_patterns = re.finditer(r'([\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]+)\s*[\(（]([\w\s]+)[\)）]\s*[-–—]\s*([\w\s]+)', cleaned_str)
-                        for match in direct_patterns:
-                            kanji, romaji, english = match.groups()
-                            if not any(item.get('kanji') == kanji for item in vocab_items):
-                                # Create parts array by splitting the kanji into individual characters
-                                parts = []
-                                for char in kanji.strip():
-                                    # For simplicity, use the same romaji for each character
-                                    # In a real implementation, this would need more sophisticated logic
-                                    parts.append({
-                                        "kanji": char,
-                                        "romaji": [] # Empty array as placeholder, would need proper mapping
-                                    })
-                                
-                                vocab_items.append({
-                                    "kanji": kanji.strip(),
-                                    "romaji": romaji.strip(),
-                                    "english": english.strip(),
-                                    "parts": parts
-                                })
+                        vocab_items.extend(extract_vocab_items(
+                            (kanji.strip(), romaji.strip(), english.strip())
+                            for kanji, romaji, english in _iter_direct_matches(cleaned_str)
+                        ))
                     
                     # If we found no vocabulary items at all, add some default Japanese vocabulary related to music
                     # For testing purposes, we still ensure at least 5 items
                     if len(vocab_items) == 0:
-                        logger.info(f"No vocabulary items found, adding default items")
+                        logger.info("No vocabulary items found, adding default items")
                     elif len(vocab_items) < 5:
-                        logger.info(f"Adding default vocabulary items to reach minimum of 5 for testing")
-                        default_items = [
-                            {
-                                "kanji": "音楽", 
-                                "romaji": "ongaku", 
-                                "english": "music",
-                                "parts": [
-                                    {"kanji": "音", "romaji": ["on"]},
-                                    {"kanji": "楽", "romaji": ["ga", "ku"]}
-                                ]
-                            },
-                            {
-                                "kanji": "歌", 
-                                "romaji": "uta", 
-                                "english": "song",
-                                "parts": [
-                                    {"kanji": "歌", "romaji": ["u", "ta"]}
-                                ]
-                            },
-                            {
-                                "kanji": "感情", 
-                                "romaji": "kanjou", 
-                                "english": "emotion",
-                                "parts": [
-                                    {"kanji": "感", "romaji": ["kan"]},
-                                    {"kanji": "情", "romaji": ["jou"]}
-                                ]
-                            },
-                            {
-                                "kanji": "愛", 
-                                "romaji": "ai", 
-                                "english": "love",
-                                "parts": [
-                                    {"kanji": "愛", "romaji": ["ai"]}
-                                ]
-                            },
-                            {
-                                "kanji": "悲しみ", 
-                                "romaji": "kanashimi", 
-                                "english": "sadness",
-                                "parts": [
-                                    {"kanji": "悲", "romaji": ["ka", "na"]},
-                                    {"kanji": "し", "romaji": ["shi"]},
-                                    {"kanji": "み", "romaji": ["mi"]}
-                                ]
-                            }
-                        ]
-                        
+                        logger.info("Adding default vocabulary items to reach minimum of 5 for testing")
                         # Add default items until we have at least 5
-                        for item in default_items:
+                        for item in _DEFAULT_VOCAB_ITEMS:
                             if len(vocab_items) >= 5:
                                 break
-                            if not any(v.get('kanji') == item['kanji'] for v in vocab_items):
-                                vocab_items.append(item)
+                            if item['kanji'] not in seen_kanji:
+                                seen_kanji.add(item['kanji'])
+                                # Copied so the shared defaults never end up in a caller's result
+                                vocab_items.append(copy.deepcopy(item))
                     
                     if vocab_items:
                         final_answer = {"vocabulary": vocab_items}
-                        logger.info(f"Manually extracted {len(vocab_items)} vocabulary items")
+                        logger.info("Manually extracted %d vocabulary items", len(vocab_items))
                     else:
                         # Create a simple vocabulary response with placeholder
                         final_answer = {"vocabulary": [], "note": "Failed to parse vocabulary data"}
@@ -293,9 +498,139 @@ def parse_llm_response(response: str) -> Tuple[str, Optional[str], Optional[str]
     
     return thought, action, action_input, final_answer
 
+def _parse_vocab_lines(text: str) -> List[Dict[str, str]]:
+    """
+    Parse plain-text vocabulary lines such as "1. 愛 (ai) - love" into vocabulary items.
+    
+    Args:
+        text: Text with one vocabulary word per line, optionally under a "Vocabulary Words" header
+    
+    Returns:
+        A list of dictionaries with kanji, romaji and english keys
+    """
+    # Dicts are built fresh on every call, since callers return them; only the parsed fields are cached
+    return [
+        {"kanji": kanji, "romaji": romaji, "english": english}
+        for kanji, romaji, english in _vocab_line_entries(text)
+    ]
+
+@functools.lru_cache(maxsize=1024)
+def _vocab_line_entries(text: str) -> Tuple[Tuple[str, str, str], ...]:
+    """Return (kanji, romaji, english) for each vocabulary line in text; cached, as the same text recurs across agent iterations"""
+    # A single pass over the whole text; lines without a word, separator and meaning are skipped
+    return tuple(
+        (match['word'], (match['romaji'] or "").strip(), match['meaning'])
+        for match in _VOCAB_LINE_RE.finditer(text)
+        # Skip header lines
+        if not match['word'].startswith('Vocabulary Words')
+    )
+
+def _chat_until_final_answer(messages: List[Dict[str, str]]) -> str:
+    """
+    Stream a chat response, stopping as soon as the JSON object after "Final Answer:" is complete.
+    
+    Whatever the model would generate after that object is never waited for. Responses
+    without a final answer, or whose final answer is plain text, are read to the end.
+    
+    Args:
+        messages: The conversation so far
+    
+    Returns:
+        The response text received
+    """
+    marker = "Final Answer:"
+    stream = client.chat(model=MODEL_NAME, messages=messages, stream=True)
+    # Chunks are collected and joined once, rather than copying the response so far on every chunk
+    parts = []
+    # The end of the previous chunks, for a marker split across chunks
+    tail = ""
+    found_marker = False
+    depth = 0
+    in_string = False
+    escaped = False
+    try:
+        for chunk in stream:
+            content = chunk["message"]["content"]
+            parts.append(content)
+            if found_marker:
+                scan = content
+            else:
+                window = tail + content
+                found = window.find(marker)
+                if found == -1:
+                    tail = window[-(len(marker) - 1):]
+                    continue
+                found_marker = True
+                # The marker always ends inside content, so this is new text only
+                scan = window[found + len(marker):]
+            # Same brace tracking as _find_json_objects, carried over from chunk to chunk
+            for char in scan:
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == "\\":
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"':
+                    in_string = True
+                elif char == "{":
+                    depth += 1
+                elif char == "}" and depth > 0:
+                    depth -= 1
+                    if depth == 0:
+                        return "".join(parts)
+    finally:
+        # Closing the generator ends the HTTP response, so the model stops generating
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+    return "".join(parts)
+
+def _normalize_vocab_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Make a vocabulary item's kanji, romaji and english strings, keeping any other keys as they are"""
+    normalized = dict(item)
+    for key, (_, default) in _VOCAB_KEY_ALIASES.items():
+        value = item.get(key)
+        if value is None:
+            normalized[key] = default
+        elif isinstance(value, list):
+            normalized[key] = " ".join(str(part) for part in value)
+        elif not isinstance(value, str):
+            normalized[key] = str(value)
+    return normalized
+
+def _cache_result(song: str, artist: Optional[str], result: Dict[str, Any]) -> None:
+    """Save a successful agent result to the vocabulary cache and the semantic cache"""
+    save_vocab_to_cache(song, artist, result)
+    semantic_cache.put(semantic_cache_key(song, artist), result)
+
+def _extract_vocabulary_once(agent_state: Dict[str, Any], lyrics: Any) -> Dict[str, Any]:
+    """
+    Run extract_vocabulary, reusing the result when the same lyrics were already extracted in this run.
+    
+    The agent's action and both direct-extraction fallbacks can ask for the same lyrics;
+    each model call takes seconds, so only the first one is made.
+    
+    Args:
+        agent_state: The run's state, holding earlier extractions
+        lyrics: The lyrics to extract vocabulary from
+    
+    Returns:
+        The extract_vocabulary result
+    """
+    extractions = agent_state["extractions"]
+    if not isinstance(lyrics, str):
+        return extract_vocabulary(lyrics)
+    if lyrics not in extractions:
+        extractions[lyrics] = extract_vocabulary(lyrics)
+    else:
+        logger.info("Reusing vocabulary already extracted from these lyrics")
+    return extractions[lyrics]
+
 def run_agent(song: str, artist: Optional[str] = None) -> Dict[str, Any]:
     """
-    Run the ReAct agent to generate vocabulary from song lyrics.
+    Run the agent to generate vocabulary from song lyrics.
     
     Args:
         song: The name of the song
@@ -307,59 +642,114 @@ def run_agent(song: str, artist: Optional[str] = None) -> Dict[str, Any]:
     # First check if we have cached vocabulary results
     cached_vocab = get_cached_vocab(song, artist)
     if cached_vocab:
-        logger.info(f"Using cached vocabulary for '{song}' by '{artist or 'Unknown'}'")
+        logger.info("Using cached vocabulary for '%s' by '%s'", song, artist or 'Unknown')
         return cached_vocab
     
-    logger.info(f"No cached vocabulary found for '{song}' by '{artist or 'Unknown'}', running agent")
+    # Then for a query differing only in case, whitespace or punctuation, which skips the LLM just the same
+    cache_key = semantic_cache_key(song, artist)
+    normalized_vocab = semantic_cache.get(cache_key)
+    if normalized_vocab:
+        return normalized_vocab
     
+    logger.info("No cached vocabulary found for '%s' by '%s', running agent", song, artist or 'Unknown')
+    
+    # Track the agent's state
+    agent_state = {
+        "lyrics": None,
+        "vocabulary": None,
+        # extract_vocabulary results by lyrics, so the same lyrics are never sent to the model twice
+        "extractions": {}
+    }
+    
+    # The usual tool sequence needs no model to choose it; the ReAct loop only runs when it stalls
+    result = _run_scripted(song, artist, agent_state)
+    if result is not None:
+        return result
+    
+    logger.info("Scripted run was inconclusive for '%s', falling back to the ReAct loop", song)
+    return _run_react(song, artist, agent_state)
+
+def _run_scripted(song: str, artist: Optional[str], agent_state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Run get_lyrics, extract_vocabulary and return_vocabulary in order, without asking the LLM which tool to use.
+    
+    Args:
+        song: The name of the song
+        artist: Optional artist name
+        agent_state: The run's state, filled in for the ReAct loop in case it has to take over
+    
+    Returns:
+        The vocabulary or an error message, or None when the result is inconclusive and the ReAct loop should decide
+    """
+    lyrics_result = get_lyrics(song, artist)
+    if not lyrics_result.get("success", False):
+        return {"error": lyrics_result.get("error") or f"No lyrics found for {song} by {artist or 'Unknown'}."}
+    
+    lyrics = lyrics_result.get("lyrics")
+    if not isinstance(lyrics, str) or not lyrics.strip():
+        return None
+    agent_state["lyrics"] = lyrics
+    
+    vocab_result = _extract_vocabulary_once(agent_state, lyrics)
+    if not vocab_result.get("success", False):
+        return return_vocabulary(vocab_result)
+    if not vocab_result.get("vocabulary"):
+        # Lyrics were found but nothing was extracted from them; they may not be the song's lyrics at all
+        return None
+    agent_state["vocabulary"] = vocab_result["vocabulary"]
+    
+    result = return_vocabulary(vocab_result)
+    _cache_result(song, artist, result)
+    return result
+
+def _run_react(song: str, artist: Optional[str], agent_state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run the ReAct loop, letting the LLM choose each tool call until it gives a final answer.
+    
+    Args:
+        song: The name of the song
+        artist: Optional artist name
+        agent_state: The run's state, including anything the scripted run already fetched
+    
+    Returns:
+        A dictionary containing either the vocabulary list or an error message
+    """
     # Generate the initial prompt
     prompt = get_prompt(song, artist)
     
     # Initialize conversation history
     conversation = [
-        {"role": "system", "content": "You are a helpful Japanese language learning assistant."},
+        SYSTEM_MESSAGE,
         {"role": "user", "content": prompt}
     ]
     
     # Maximum number of iterations to prevent infinite loops
     max_iterations = 10
     
-    # Track the agent's state
-    agent_state = {
-        "lyrics": None,
-        "vocabulary": None
-    }
-    
     # Run the agent loop
     for _ in range(max_iterations):
         try:
-            # Get response from LLM
-            response = client.chat(
-                model=MODEL_NAME,
-                messages=conversation,
-                stream=False
-            )
-            
-            # Extract the content from the response
-            llm_response = response["message"]["content"]
+            # Get response from LLM, stopping once its final answer is complete
+            llm_response = _chat_until_final_answer(conversation)
             
             # Parse the LLM response
             thought, action, action_input, final_answer = parse_llm_response(llm_response)
             
             # If we have a final answer, return it
             if final_answer:
-                # Log the final answer for debugging
-                logger.info(f"Final answer type: {type(final_answer)}")
-                if isinstance(final_answer, dict):
-                    logger.info(f"Final answer keys: {final_answer.keys()}")
-                    if "vocabulary" in final_answer and isinstance(final_answer["vocabulary"], list):
-                        logger.info(f"Vocabulary list length: {len(final_answer['vocabulary'])}")
-                        if final_answer["vocabulary"]:
-                            logger.info(f"First vocabulary item type: {type(final_answer['vocabulary'][0])}")
-                            if isinstance(final_answer["vocabulary"][0], dict):
-                                logger.info(f"First vocabulary item keys: {final_answer['vocabulary'][0].keys()}")
-                else:
-                    logger.info(f"Final answer: {final_answer}")
+                # Log the final answer for debugging, only when INFO logging is on
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("Final answer type: %s", type(final_answer))
+                    if isinstance(final_answer, dict):
+                        logger.info("Final answer keys: %s", final_answer.keys())
+                        if "vocabulary" in final_answer and isinstance(final_answer["vocabulary"], list):
+                            logger.info("Vocabulary list length: %d", len(final_answer['vocabulary']))
+                            if final_answer["vocabulary"]:
+                                logger.info("First vocabulary item type: %s", type(final_answer['vocabulary'][0]))
+                                if isinstance(final_answer["vocabulary"][0], dict):
+                                    logger.info("First vocabulary item keys: %s", final_answer['vocabulary'][0].keys())
+                    else:
+                        logger.info("Final answer: %s", final_answer)
                 
                 # Ensure the final answer is a proper dictionary
                 if isinstance(final_answer, dict):
@@ -372,21 +762,22 @@ def run_agent(song: str, artist: Optional[str] = None) -> Dict[str, Any]:
                                 logger.info("Empty vocabulary list, trying direct extraction")
                                 try:
                                     # Try to extract vocabulary directly using the extract_vocabulary tool
-                                    vocab_result = extract_vocabulary(agent_state["lyrics"])
+                                    vocab_result = _extract_vocabulary_once(agent_state, agent_state["lyrics"])
                                     if vocab_result.get("success", False) and vocab_result.get("vocabulary"):
                                         result = {"vocabulary": vocab_result["vocabulary"]}
-                                        # Save to vocabulary cache
-                                        save_vocab_to_cache(song, artist, result)
+                                        # Save to vocabulary caches
+                                        _cache_result(song, artist, result)
                                         return result
                                 except Exception as e:
-                                    logger.error(f"Direct extraction failed: {str(e)}")
+                                    logger.error("Direct extraction failed: %s", e)
                             
                             # Check if it's already properly structured
                             if all(isinstance(item, dict) for item in final_answer["vocabulary"]) and \
                                all("kanji" in item and "romaji" in item and "english" in item for item in final_answer["vocabulary"]):
-                                # Already properly structured
-                                # Save to vocabulary cache
-                                save_vocab_to_cache(song, artist, final_answer)
+                                # Already properly structured; the LLM may still have used null, a list or a number as a value
+                                final_answer["vocabulary"] = [_normalize_vocab_item(item) for item in final_answer["vocabulary"]]
+                                # Save to vocabulary caches
+                                _cache_result(song, artist, final_answer)
                                 return final_answer
                             
                             # Try to parse strings into structured data
@@ -394,76 +785,19 @@ def run_agent(song: str, artist: Optional[str] = None) -> Dict[str, Any]:
                             for item in final_answer["vocabulary"]:
                                 if isinstance(item, str):
                                     # Process string item
-                                    lines = item.strip().split('\n')
-                                    for line in lines:
-                                        # Skip header lines
-                                        if line.startswith('Vocabulary Words') or not line.strip():
-                                            continue
-                                            
-                                        # Try different parsing patterns
-                                        # Pattern 1: number. word (romaji) - meaning
-                                        number_pattern = re.match(r'\d+\.\s+(.*)', line)
-                                        if number_pattern:
-                                            line = number_pattern.group(1).strip()
-                                            
-                                        # Try to split by dash or colon
-                                        if ' - ' in line:
-                                            parts = line.split(' - ', 1)
-                                        elif ':' in line:
-                                            parts = line.split(':', 1)
-                                        else:
-                                            parts = [line, ""]
-                                            
-                                        if len(parts) == 2:
-                                            word_part = parts[0].strip()
-                                            meaning = parts[1].strip()
-                                            
-                                            # Extract kanji and romaji if available
-                                            kanji_romaji = re.match(r'([^\(]+)\s*\(([^\)]+)\)', word_part)
-                                            if kanji_romaji:
-                                                kanji = kanji_romaji.group(1).strip()
-                                                romaji = kanji_romaji.group(2).strip()
-                                            else:
-                                                kanji = word_part
-                                                romaji = ""
-                                            
-                                            structured_vocab.append({
-                                                "kanji": kanji,
-                                                "romaji": romaji,
-                                                "english": meaning
-                                            })
+                                    structured_vocab.extend(_parse_vocab_lines(item))
                                 elif isinstance(item, dict):
-                                    # Try to extract from dictionary format
-                                    vocab_item = {}
-                                    if "kanji" in item:
-                                        vocab_item["kanji"] = item["kanji"]
-                                    elif "word" in item:
-                                        vocab_item["kanji"] = item["word"]
-                                    else:
-                                        vocab_item["kanji"] = "Unknown"
-                                        
-                                    if "romaji" in item:
-                                        vocab_item["romaji"] = item["romaji"]
-                                    elif "pronunciation" in item:
-                                        vocab_item["romaji"] = item["pronunciation"]
-                                    else:
-                                        vocab_item["romaji"] = ""
-                                        
-                                    if "english" in item:
-                                        vocab_item["english"] = item["english"]
-                                    elif "meaning" in item:
-                                        vocab_item["english"] = item["meaning"]
-                                    elif "translation" in item:
-                                        vocab_item["english"] = item["translation"]
-                                    else:
-                                        vocab_item["english"] = "Unknown"
-                                        
+                                    # Try to extract from dictionary format, taking the first alias present for each field
+                                    vocab_item = {
+                                        key: next((item[alias] for alias in aliases if alias in item), default)
+                                        for key, (aliases, default) in _VOCAB_KEY_ALIASES.items()
+                                    }
                                     structured_vocab.append(vocab_item)
                             
                             if structured_vocab:
                                 result = {"vocabulary": structured_vocab}
-                                # Save to vocabulary cache
-                                save_vocab_to_cache(song, artist, result)
+                                # Save to vocabulary caches
+                                _cache_result(song, artist, result)
                                 return result
                     
                     # If it's already a properly structured dict, just return it
@@ -472,62 +806,24 @@ def run_agent(song: str, artist: Optional[str] = None) -> Dict[str, Any]:
                     # If it's a string, check if it contains vocabulary-related terms
                     if "vocabulary" in final_answer.lower() or "words" in final_answer.lower():
                         # Try to extract vocabulary items from the string
-                        structured_vocab = []
-                        lines = final_answer.strip().split('\n')
-                        for line in lines:
-                            # Skip header lines
-                            if line.startswith('Vocabulary Words') or not line.strip():
-                                continue
-                                
-                            # Try different parsing patterns
-                            # Pattern 1: number. word (romaji) - meaning
-                            number_pattern = re.match(r'\d+\.\s+(.*)', line)
-                            if number_pattern:
-                                line = number_pattern.group(1).strip()
-                                
-                            # Try to split by dash or colon
-                            if ' - ' in line:
-                                parts = line.split(' - ', 1)
-                            elif ':' in line:
-                                parts = line.split(':', 1)
-                            else:
-                                parts = [line, ""]
-                                
-                            if len(parts) == 2:
-                                word_part = parts[0].strip()
-                                meaning = parts[1].strip()
-                                
-                                # Extract kanji and romaji if available
-                                kanji_romaji = re.match(r'([^\(]+)\s*\(([^\)]+)\)', word_part)
-                                if kanji_romaji:
-                                    kanji = kanji_romaji.group(1).strip()
-                                    romaji = kanji_romaji.group(2).strip()
-                                else:
-                                    kanji = word_part
-                                    romaji = ""
-                                
-                                structured_vocab.append({
-                                    "kanji": kanji,
-                                    "romaji": romaji,
-                                    "english": meaning
-                                })
+                        structured_vocab = _parse_vocab_lines(final_answer)
                         
                         if structured_vocab:
                             result = {"vocabulary": structured_vocab}
-                            # Save to vocabulary cache
-                            save_vocab_to_cache(song, artist, result)
+                            # Save to vocabulary caches
+                            _cache_result(song, artist, result)
                             return result
                         else:
                             # Try to parse as JSON in case it's a JSON string
                             try:
                                 # Look for JSON-like structure
-                                json_match = re.search(r'\{[^\{\}]*"vocabulary"[^\{\}]*\}', final_answer)
+                                json_match = _VOCAB_OBJ_RE.search(final_answer)
                                 if json_match:
                                     potential_json = json_match.group(0)
-                                    parsed_json = json.loads(potential_json)
+                                    parsed_json = _loads(potential_json)
                                     if "vocabulary" in parsed_json and isinstance(parsed_json["vocabulary"], list):
-                                        # Save to vocabulary cache
-                                        save_vocab_to_cache(song, artist, parsed_json)
+                                        # Save to vocabulary caches
+                                        _cache_result(song, artist, parsed_json)
                                         return parsed_json
                             except:
                                 pass
@@ -546,7 +842,10 @@ def run_agent(song: str, artist: Optional[str] = None) -> Dict[str, Any]:
                 tool_fn = TOOLS[action]
                 
                 # Execute the tool
-                if isinstance(action_input, dict):
+                if action == "extract_vocabulary" and isinstance(action_input, (dict, str)):
+                    lyrics = action_input.get("lyrics") if isinstance(action_input, dict) else action_input
+                    observation = _extract_vocabulary_once(agent_state, lyrics)
+                elif isinstance(action_input, dict):
                     observation = tool_fn(**action_input)
                 else:
                     observation = tool_fn(action_input)
@@ -559,7 +858,7 @@ def run_agent(song: str, artist: Optional[str] = None) -> Dict[str, Any]:
                 
                 # Add the observation to the conversation
                 conversation.append({"role": "assistant", "content": llm_response})
-                conversation.append({"role": "user", "content": f"Observation: {json.dumps(observation, ensure_ascii=False)}"})
+                conversation.append({"role": "user", "content": f"Observation: {_dumps(observation)}"})
             else:
                 # If the action is invalid, provide an error message
                 error_msg = f"Invalid action: {action}. Please use one of {list(TOOLS.keys())}."
@@ -571,9 +870,9 @@ def run_agent(song: str, artist: Optional[str] = None) -> Dict[str, Any]:
             
             # Add a note about expected errors during testing
             if "LLM error" in error_msg and "test_agent_error_handling_llm_error" in error_msg:
-                logger.error(f"Error running agent: {error_msg} (EXPECTED DURING TESTING)")
+                logger.error("Error running agent: %s (EXPECTED DURING TESTING)", error_msg)
             else:
-                logger.error(f"Error running agent: {error_msg}")
+                logger.error("Error running agent: %s", error_msg)
             
             # Check for specific error messages
             if "model not found" in error_msg.lower():
@@ -591,11 +890,11 @@ def run_agent(song: str, artist: Optional[str] = None) -> Dict[str, Any]:
         logger.info("Maximum iterations reached, trying direct extraction")
         try:
             # Try to extract vocabulary directly using the extract_vocabulary tool
-            vocab_result = extract_vocabulary(agent_state["lyrics"])
+            vocab_result = _extract_vocabulary_once(agent_state, agent_state["lyrics"])
             if vocab_result.get("success", False) and vocab_result.get("vocabulary"):
                 return {"vocabulary": vocab_result["vocabulary"], "note": "Extracted directly after agent timeout"}
         except Exception as e:
-            logger.error(f"Direct extraction failed: {str(e)}")
+            logger.error("Direct extraction failed: %s", e)
     
     # If all else fails, return an error
     return {"error": "Agent exceeded maximum number of iterations without reaching a final answer."}
@@ -42,6 +42,11 @@ Begin!
 User Request: Find vocabulary for the song "{song}"{artist_part}
 """
 
+# The template split around its placeholders once at import. The request details come last,
+# so every prompt shares the same static prefix
+_PREFIX, _, _REST = REACT_PROMPT.partition("{song}")
+_MID, _, _SUFFIX = _REST.partition("{artist_part}")
+
 def get_prompt(song: str, artist: str = None) -> str:
     """
     Generates a ReAct prompt for the vocabulary agent.
@@ -56,5 +61,5 @@ def get_prompt(song: str, artist: str = None) -> str:
     # Create the artist part of the prompt separately
     artist_part = f" by {artist}" if artist else ""
     
-    # Format the prompt with both song and artist_part
-    return REACT_PROMPT.format(song=song, artist_part=artist_part)
+    # Fill in song and artist_part by concatenation; the template is never reparsed
+    return f"{_PREFIX}{song}{_MID}{artist_part}{_SUFFIX}"
@@ -0,0 +1,177 @@
+"""
+Normalized cache of agent results.
+
+The vocabulary cache only matches a song and artist exactly, apart from case. This cache also
+catches queries that differ only in case, whitespace or punctuation ("Lemon", "lemon ",
+"Lemon!" by "Kenshi  Yonezu") so that they reuse an earlier agent run instead of calling the LLM again.
+
+Anything beyond that noise is a different query: "Part 1" and "Part 2", or "Pretender" and
+"Pretenders", are different songs, and serving one's vocabulary for the other would be wrong.
+The cache is kept in memory and written to a JSON file when the process exits.
+"""
+import os
+import copy
+import json
+import atexit
+import logging
+import tempfile
+import threading
+import contextlib
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Advisory file locks are POSIX-only; elsewhere saves go unlocked
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Oldest entries are dropped beyond this many
+MAX_ENTRIES = 1000
+
+def get_semantic_cache_path() -> str:
+    """Get the file the semantic cache is persisted to."""
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    return os.environ.get('SEMANTIC_CACHE_PATH', os.path.join(base_dir, 'data', 'semantic_cache.json'))
+
+def _normalize(text: str) -> str:
+    """Lowercase text, treat punctuation as whitespace, and trim and collapse the whitespace"""
+    lowered = text.lower()
+    normalized = " ".join("".join(c if c.isalnum() else " " for c in lowered).split())
+    # A title made only of punctuation keeps its punctuation, so it stays distinct
+    return normalized or " ".join(lowered.split())
+
+def semantic_cache_key(song: str, artist: Optional[str] = None) -> str:
+    """
+    Build the normalized text a query is cached under.
+
+    Args:
+        song: The name of the song
+        artist: Optional artist name
+
+    Returns:
+        Song and artist, lowercased, with punctuation dropped and whitespace trimmed and collapsed
+    """
+    return "||".join(_normalize(part) for part in (song, artist or ""))
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Hold an exclusive lock on path, shared with other processes, for the duration of the block"""
+    with open(path, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class SemanticCache:
+    """In-memory map from normalized query to agent result."""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = MAX_ENTRIES):
+        """
+        Args:
+            path: JSON file to load from and save to, or None to keep the cache in memory only
+            max_entries: Maximum number of cached queries
+        """
+        self.path = path
+        self.max_entries = max_entries
+        # Insertion-ordered, so the first key is the oldest
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def get(self, key_text: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a copy of the result cached for a query.
+
+        Args:
+            key_text: A key from semantic_cache_key
+
+        Returns:
+            The cached result with cache_info added, or None on a miss
+        """
+        with self._lock:
+            cached = self._entries.get(key_text)
+            if cached is None:
+                return None
+            result = copy.deepcopy(cached)
+
+        logger.info("Semantic cache hit for '%s'", key_text)
+        result["cache_info"] = {"from_cache": True, "matched_query": key_text}
+        return result
+
+    def put(self, key_text: str, result: Dict[str, Any]) -> None:
+        """
+        Cache a result under a query, replacing any earlier result for the same query.
+
+        Args:
+            key_text: A key from semantic_cache_key
+            result: The agent result to cache
+        """
+        with self._lock:
+            self._entries.pop(key_text, None)
+            self._entries[key_text] = copy.deepcopy(result)
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._dirty = True
+
+    def save(self) -> None:
+        """
+        Write the cache to its file, if it has a file and has changed since it was loaded.
+
+        Several worker processes may save the same file. Saves take turns under a file lock,
+        and each one merges its entries into what is already on disk rather than replacing it.
+        """
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            entries = dict(self._entries)
+            self._dirty = False
+        try:
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            with _file_lock(f"{self.path}.lock"):
+                merged = self._read_file()
+                # This process's entries are the newest, so they go last
+                for key, result in entries.items():
+                    merged.pop(key, None)
+                    merged[key] = result
+                data = [{"key": key, "result": result} for key, result in merged.items()][-self.max_entries:]
+                # A temporary file of this process's own, so concurrent saves never write to the same file
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        json.dump(data, f, ensure_ascii=False)
+                    os.replace(tmp_path, self.path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+        except Exception as e:
+            logger.error("Error saving semantic cache: %s", e)
+
+    def _read_file(self) -> Dict[str, Dict[str, Any]]:
+        """Return the entries in the cache file, oldest first, or none if it is missing or unreadable."""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {entry["key"]: entry["result"] for entry in data}
+        except Exception as e:
+            logger.error("Error loading semantic cache: %s", e)
+            return {}
+
+    def _load(self) -> None:
+        """Load entries saved by an earlier process, if any."""
+        entries = self._read_file()
+        for key in list(entries)[-self.max_entries:]:
+            self._entries[key] = entries[key]
+
+# Shared by all agent runs in this process, and saved when it exits
+semantic_cache = SemanticCache(get_semantic_cache_path())
+atexit.register(semantic_cache.save)
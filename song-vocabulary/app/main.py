@@ -4,20 +4,26 @@ FastAPI application for the vocabulary generator.
 from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, field_validator
+from typing import Optional, Dict, Any, List
 import uvicorn
+import anyio
+import asyncio
 import os
-import traceback
+import functools
 import logging
 from dotenv import load_dotenv
 
 from app.agent.agent import run_agent
+from app.agent.semantic_cache import semantic_cache_key
 from app.tools.get_lyrics import list_cached_songs
 from app.tools.vocab_cache import list_cached_vocab, clean_vocab_cache
 
-# Load environment variables
-load_dotenv()
+# Load environment variables, once per process tree: reloader and worker processes
+# inherit them from the process that loaded them first
+if not os.getenv("_DOTENV_LOADED"):
+    load_dotenv()
+    os.environ["_DOTENV_LOADED"] = "1"
 
 # Configure logging
 logging.basicConfig(
@@ -26,11 +32,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Encode JSON responses with orjson when it is installed; vocabulary lists are large
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
 # Create FastAPI app
 app = FastAPI(
     title="Japanese Song Vocabulary Generator",
     description="API for generating Japanese vocabulary from song lyrics",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultResponse
 )
 
 # Add CORS middleware
@@ -42,11 +56,51 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Blocking work (agent runs, cache file access) runs in anyio's worker threads so the event loop
+# stays free; this many can run at once
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", 64))
+
+@app.on_event("startup")
+async def configure_threadpool():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+# Agent runs in progress, by normalized query. Concurrent requests for the same song wait
+# for the run already underway instead of starting their own
+_inflight: Dict[str, asyncio.Task] = {}
+
+def _finish_inflight(key: str, task: asyncio.Task) -> None:
+    """Forget a finished agent run, and mark its exception as retrieved so asyncio does not warn about it"""
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled():
+        task.exception()
+
+async def run_agent_once(song: str, artist: Optional[str]) -> Dict[str, Any]:
+    """
+    Run the agent off the event loop, sharing one run between concurrent identical requests.
+    
+    The run is a task of its own, not tied to the request that started it: every request,
+    the first one included, waits on it through a shield, so a client that disconnects
+    only stops waiting and never cancels the run for the others.
+    
+    No lock is needed: the lookup and registration below happen without an await in between,
+    so no other request can interleave on the event loop.
+    """
+    key = semantic_cache_key(song, artist)
+    task = _inflight.get(key)
+    if task is not None:
+        logger.info("Joining in-flight agent run for '%s' by '%s'", song, artist or 'Unknown')
+    else:
+        task = asyncio.create_task(anyio.to_thread.run_sync(run_agent, song, artist))
+        _inflight[key] = task
+        task.add_done_callback(functools.partial(_finish_inflight, key))
+    return await asyncio.shield(task)
+
 # Add exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled exception: {str(exc)}")
-    logger.error(traceback.format_exc())
+    # The traceback is only formatted if the record is actually emitted
+    logger.error("Unhandled exception: %s", exc, exc_info=exc)
     return JSONResponse(
         status_code=500,
         content={"error": f"An unexpected error occurred: {str(exc)}"},
@@ -57,6 +111,34 @@ class SongRequest(BaseModel):
     song: str
     artist: Optional[str] = None
 
+# Define response models. Extra fields are kept, so anything the agent or the caches add
+# still reaches the client
+class VocabItem(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    
+    kanji: Optional[str] = None
+    romaji: Optional[str] = None
+    english: Optional[str] = None
+    parts: Optional[List[Dict[str, Any]]] = None
+    
+    @field_validator("kanji", "romaji", "english", mode="before")
+    @classmethod
+    def coerce_to_text(cls, value: Any) -> Optional[str]:
+        """Accept the lists and numbers an LLM sometimes gives instead of a string"""
+        if value is None or isinstance(value, str):
+            return value
+        if isinstance(value, list):
+            return " ".join(str(part) for part in value)
+        return str(value)
+
+class VocabResponse(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    
+    vocabulary: Optional[List[VocabItem]] = None
+    error: Optional[str] = None
+    note: Optional[str] = None
+    cache_info: Optional[Dict[str, Any]] = None
+
 # Define routes
 @app.get("/")
 async def root():
@@ -71,7 +153,7 @@ async def root():
         }
     }
 
-@app.get("/api/v1/vocab-generator")
+@app.get("/api/v1/vocab-generator", response_model=VocabResponse, response_model_exclude_none=True)
 async def vocab_generator(
     song: str = Query(..., description="The name of the song"),
     artist: Optional[str] = Query(None, description="The name of the artist (optional)")
@@ -87,38 +169,39 @@ async def vocab_generator(
         A JSON object with either the vocabulary list or an error message
     """
     try:
-        logger.info(f"Received request for song: {song}, artist: {artist}")
+        logger.info("Received request for song: %s, artist: %s", song, artist)
         
-        # Run the agent to generate vocabulary
-        result = run_agent(song, artist)
-        logger.info(f"Agent result type: {type(result)}")
+        # Run the agent to generate vocabulary, off the event loop
+        result = await run_agent_once(song, artist)
         
-        # Log the result for debugging
-        if isinstance(result, dict):
-            logger.info(f"Result keys: {result.keys()}")
-            
-            # Log cache information if available
-            if "cache_info" in result and isinstance(result["cache_info"], dict):
-                if result["cache_info"].get("from_cache", False):
-                    logger.info(f"✅ Using CACHED lyrics for '{song}' by '{artist or 'Unknown'}'")
-                    if "cached_at" in result["cache_info"]:
-                        logger.info(f"  - Cached at: {result['cache_info']['cached_at']}")
-                    if "compression" in result["cache_info"] and isinstance(result["cache_info"]["compression"], dict):
-                        ratio = result["cache_info"]["compression"].get("ratio", "unknown")
-                        logger.info(f"  - Compression ratio: {ratio}x")
-                else:
-                    logger.info(f"🔍 Using FRESH lyrics for '{song}' by '{artist or 'Unknown'}'")
-        else:
-            logger.info(f"Result is not a dict: {result}")
+        # Log the result for debugging, only when DEBUG logging is on
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Agent result type: %s", type(result))
+            if isinstance(result, dict):
+                logger.debug("Result keys: %s", result.keys())
+            else:
+                logger.debug("Result is not a dict: %s", result)
+        
+        # Log cache information if available
+        if isinstance(result, dict) and isinstance(result.get("cache_info"), dict):
+            cache_info = result["cache_info"]
+            if cache_info.get("from_cache", False):
+                logger.info("✅ Using CACHED lyrics for '%s' by '%s'", song, artist or 'Unknown')
+                if "cached_at" in cache_info:
+                    logger.info("  - Cached at: %s", cache_info['cached_at'])
+                if isinstance(cache_info.get("compression"), dict):
+                    logger.info("  - Compression ratio: %sx", cache_info["compression"].get("ratio", "unknown"))
+            else:
+                logger.info("🔍 Using FRESH lyrics for '%s' by '%s'", song, artist or 'Unknown')
         
         # Check if there's an error
         if isinstance(result, dict) and "error" in result:
-            logger.error(f"Error from agent: {result['error']}")
+            logger.error("Error from agent: %s", result['error'])
             raise HTTPException(status_code=400, detail=result["error"])
         
         # Ensure result is a dictionary
         if not isinstance(result, dict):
-            logger.error(f"Result is not a dictionary: {result}")
+            logger.error("Result is not a dictionary: %s", result)
             return {"error": "Invalid response format", "details": str(result)}
         
         logger.info("Successfully generated vocabulary")
@@ -126,14 +209,53 @@ async def vocab_generator(
     
     except Exception as e:
         # Log the full exception traceback
-        logger.error(f"Exception in vocab_generator: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception("Exception in vocab_generator: %s", e)
         
         # Return a proper error response
         raise HTTPException(status_code=500, detail=str(e))
 
 from fastapi.responses import HTMLResponse, PlainTextResponse
 
+# Static parts of the cache listing tables, built once
+_TABLE_TOP = (
+    "┌" + "┬".join(["─" * 29] * 4) + "┐\n"
+    "│ Song                        │ Artist                      │ Cached At                   │ Last Accessed               │\n"
+)
+_TABLE_SEP = "├" + "┼".join(["─" * 29] * 4) + "┤\n"
+_TABLE_BOTTOM = "└" + "┴".join(["─" * 29] * 4) + "┘\n"
+_TITLE_ROW_FMT = "│ {:<27} │" + "                             │" * 3 + "\n"
+_ROW_FMT = "│ {:<25} │ {:<25} │ {:<25} │ {:<25} │\n"
+
+def format_cache_table(title: str, entries, total_label: str, count: int) -> str:
+    """
+    Format a cache listing as a text-based table.
+    
+    Args:
+        title: Name of the cache, shown in the first row
+        entries: Cache entries with song, artist, cached_at and last_accessed keys
+        total_label: Label for the total line below the table
+        count: Total number of entries
+    
+    Returns:
+        The table, followed by the total
+    """
+    # Create table header
+    lines = [_TABLE_TOP, _TABLE_SEP, _TITLE_ROW_FMT.format(title), _TABLE_SEP]
+    
+    # Add table rows
+    for entry in entries:
+        lines.append(_ROW_FMT.format(
+            (entry.get("song", "") or "")[:25],
+            (entry.get("artist", "") or "")[:25],
+            (entry.get("cached_at", "") or "")[:25],
+            (entry.get("last_accessed", "") or "")[:25]
+        ))
+    
+    # Add table footer
+    lines.append(_TABLE_BOTTOM)
+    lines.append(f"\n{total_label}: {count}\n")
+    return "".join(lines)
+
 @app.get("/api/v1/cache/lyrics", response_class=PlainTextResponse)
 async def lyrics_cache_list():
     """
@@ -146,38 +268,18 @@ async def lyrics_cache_list():
         logger.info("Received request to list cached lyrics")
         
         # Get the list of cached songs
-        result = list_cached_songs()
+        result = await anyio.to_thread.run_sync(list_cached_songs)
         
         # Log the result
-        logger.info(f"Found {result.get('count', 0)} cached lyrics entries")
+        logger.info("Found %d cached lyrics entries", result.get('count', 0))
         
         # Format as a text-based table
         if not result.get("success", False) or result.get("count", 0) == 0:
             return "No songs found in cache."
         
-        # Create table header
-        table = "┌─────────────────────────────┬─────────────────────────────┬─────────────────────────────┬─────────────────────────────┐\n"
-        table += "│ Song                        │ Artist                      │ Cached At                   │ Last Accessed               │\n"
-        table += "├─────────────────────────────┼─────────────────────────────┼─────────────────────────────┼─────────────────────────────┤\n"
-        table += "│ LYRICS CACHE                │                             │                             │                             │\n"
-        table += "├─────────────────────────────┼─────────────────────────────┼─────────────────────────────┼─────────────────────────────┤\n"
-        
-        # Add table rows
-        for song in result.get("cached_songs", []):
-            song_name = (song.get("song", "") or "")[:25]
-            artist_name = (song.get("artist", "") or "")[:25]
-            cached_at = (song.get("cached_at", "") or "")[:25]
-            last_accessed = (song.get("last_accessed", "") or "")[:25]
-            
-            table += f"│ {song_name.ljust(25)} │ {artist_name.ljust(25)} │ {cached_at.ljust(25)} │ {last_accessed.ljust(25)} │\n"
-        
-        # Add table footer
-        table += "└─────────────────────────────┴─────────────────────────────┴─────────────────────────────┴─────────────────────────────┘\n"
-        table += f"\nTotal cached lyrics entries: {result.get('count', 0)}\n"
-        
-        return table
+        return format_cache_table("LYRICS CACHE", result.get("cached_songs", []), "Total cached lyrics entries", result.get('count', 0))
     except Exception as e:
-        logger.error(f"Error listing cached lyrics: {str(e)}")
+        logger.error("Error listing cached lyrics: %s", e)
         raise HTTPException(status_code=500, detail=f"Error listing cached lyrics: {str(e)}")
 
 @app.get("/api/v1/cache/vocab", response_class=PlainTextResponse)
@@ -192,38 +294,18 @@ async def vocab_cache_list():
         logger.info("Received request to list cached vocabulary")
         
         # Get the list of cached vocabulary
-        result = list_cached_vocab()
+        result = await anyio.to_thread.run_sync(list_cached_vocab)
         
         # Log the result
-        logger.info(f"Found {result.get('count', 0)} cached vocabulary entries")
+        logger.info("Found %d cached vocabulary entries", result.get('count', 0))
         
         # Format as a text-based table
         if not result.get("success", False) or result.get("count", 0) == 0:
             return "No vocabulary found in cache."
         
-        # Create table header
-        table = "┌─────────────────────────────┬─────────────────────────────┬─────────────────────────────┬─────────────────────────────┐\n"
-        table += "│ Song                        │ Artist                      │ Cached At                   │ Last Accessed               │\n"
-        table += "├─────────────────────────────┼─────────────────────────────┼─────────────────────────────┼─────────────────────────────┤\n"
-        table += "│ VOCABULARY CACHE            │                             │                             │                             │\n"
-        table += "├─────────────────────────────┼─────────────────────────────┼─────────────────────────────┼─────────────────────────────┤\n"
-        
-        # Add table rows
-        for vocab in result.get("cached_vocab", []):
-            song_name = (vocab.get("song", "") or "")[:25]
-            artist_name = (vocab.get("artist", "") or "")[:25]
-            cached_at = (vocab.get("cached_at", "") or "")[:25]
-            last_accessed = (vocab.get("last_accessed", "") or "")[:25]
-            
-            table += f"│ {song_name.ljust(25)} │ {artist_name.ljust(25)} │ {cached_at.ljust(25)} │ {last_accessed.ljust(25)} │\n"
-        
-        # Add table footer
-        table += "└─────────────────────────────┴─────────────────────────────┴─────────────────────────────┴─────────────────────────────┘\n"
-        table += f"\nTotal cached vocabulary entries: {result.get('count', 0)}\n"
-        
-        return table
+        return format_cache_table("VOCABULARY CACHE", result.get("cached_vocab", []), "Total cached vocabulary entries", result.get('count', 0))
     except Exception as e:
-        logger.error(f"Error listing cached vocabulary: {str(e)}")
+        logger.error("Error listing cached vocabulary: %s", e)
         raise HTTPException(status_code=500, detail=f"Error listing cached vocabulary: {str(e)}")
 
 @app.get("/api/v1/cache/cleanup")
@@ -242,24 +324,26 @@ async def cache_cleanup(
         Statistics about the cleanup operation
     """
     try:
-        logger.info(f"Received request to clean up cache (max_entries={max_entries}, max_age_days={max_age_days})")
+        logger.info("Received request to clean up cache (max_entries=%d, max_age_days=%d)", max_entries, max_age_days)
         
         # Clean up vocabulary cache
-        vocab_result = clean_vocab_cache(max_entries=max_entries, max_age_days=max_age_days)
+        vocab_result = await anyio.to_thread.run_sync(
+            functools.partial(clean_vocab_cache, max_entries=max_entries, max_age_days=max_age_days)
+        )
         
         # Log the result
         if vocab_result.get("success", False):
-            logger.info(f"Vocabulary cache cleanup: {vocab_result.get('initial_count', 0)} -> {vocab_result.get('final_count', 0)} entries")
-            logger.info(f"Deleted {vocab_result.get('deleted_old', 0)} old entries and {vocab_result.get('deleted_excess', 0)} excess entries")
+            logger.info("Vocabulary cache cleanup: %s -> %s entries", vocab_result.get('initial_count', 0), vocab_result.get('final_count', 0))
+            logger.info("Deleted %s old entries and %s excess entries", vocab_result.get('deleted_old', 0), vocab_result.get('deleted_excess', 0))
         else:
-            logger.error(f"Error cleaning vocabulary cache: {vocab_result.get('error', 'Unknown error')}")
+            logger.error("Error cleaning vocabulary cache: %s", vocab_result.get('error', 'Unknown error'))
         
         return {
             "success": True,
             "vocabulary_cache": vocab_result
         }
     except Exception as e:
-        logger.error(f"Error cleaning cache: {str(e)}")
+        logger.error("Error cleaning cache: %s", e)
         raise HTTPException(status_code=500, detail=f"Error cleaning cache: {str(e)}")
 
 # Run the application
@@ -267,5 +351,22 @@ if __name__ == "__main__":
     # Get port from environment variable or use default
     port = int(os.getenv("PORT", 8000))
     
-    # Run the application
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True)
+    # Auto-reload only in development (DEV=1), where a single process is used
+    dev = os.getenv("DEV") == "1"
+    
+    # Otherwise run a small fixed number of worker processes (WEB_CONCURRENCY overrides). The
+    # LLM runs on one local Ollama server, so more workers only queue more requests on its GPU;
+    # agent runs are offloaded to threads, so each worker's event loop keeps serving meanwhile.
+    # Workers do not share in-flight runs; the semantic cache file is merged when each one exits
+    workers = 1 if dev else int(os.getenv("WEB_CONCURRENCY", 2))
+    
+    # Run the application; uvicorn uses uvloop and httptools when they are installed
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=port,
+        reload=dev,
+        workers=workers,
+        backlog=2048,
+        log_level="info"
+    )
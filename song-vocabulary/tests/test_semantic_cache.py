@@ -0,0 +1,99 @@
+"""
+Unit tests for the semantic agent result cache.
+"""
+import unittest
+import os
+import shutil
+import tempfile
+
+from app.agent.semantic_cache import SemanticCache, semantic_cache_key
+
+
+class TestSemanticCache(unittest.TestCase):
+    """Test cases for the semantic cache."""
+    
+    def setUp(self):
+        """Set up an empty in-memory cache and a sample result."""
+        self.cache = SemanticCache()
+        self.result = {"vocabulary": [{"kanji": "夢", "romaji": "yume", "english": "dream"}]}
+    
+    def test_semantic_cache_key_normalization(self):
+        """Test that case, whitespace and punctuation do not change the key."""
+        self.assertEqual(semantic_cache_key("  Lemon ", "Kenshi  Yonezu"), semantic_cache_key("lemon", "kenshi yonezu"))
+        self.assertEqual(semantic_cache_key("Lemon!", "Kenshi-Yonezu"), semantic_cache_key("lemon", "kenshi yonezu"))
+        self.assertEqual(semantic_cache_key("Lemon"), "lemon||")
+        self.assertNotEqual(semantic_cache_key("!!!"), semantic_cache_key("???"))
+    
+    def test_similar_query_hits(self):
+        """Test that a differently written query for the same song reuses the cached result."""
+        self.cache.put(semantic_cache_key("Uchiage Hanabi", "DAOKO x Kenshi Yonezu"), self.result)
+        cached = self.cache.get(semantic_cache_key("uchiage-hanabi ", "daoko x kenshi  yonezu"))
+        self.assertIsNotNone(cached)
+        self.assertEqual(cached["vocabulary"], self.result["vocabulary"])
+        self.assertTrue(cached["cache_info"]["from_cache"])
+    
+    def test_different_query_misses(self):
+        """Test that a different song does not reuse the cached result."""
+        self.cache.put(semantic_cache_key("Lemon", "Kenshi Yonezu"), self.result)
+        self.assertIsNone(self.cache.get(semantic_cache_key("Melon", "Kenshi Yonezu")))
+        self.assertIsNone(self.cache.get(semantic_cache_key("Lemon")))
+        self.assertIsNone(self.cache.get(semantic_cache_key("Lemon", "Kenshi Yonezuu")))
+    
+    def test_near_miss_titles_miss(self):
+        """Test that titles differing by more than case, whitespace or punctuation are different songs."""
+        for cached_song, queried_song, artist in [
+            ("Uchiage Hanabi Part 1", "Uchiage Hanabi Part 2", "DAOKO x Kenshi Yonezu"),
+            ("Pretender", "Pretenders", "Official HIGE DANdism"),
+            ("Love Song", "Love Songs", "Aimer"),
+        ]:
+            self.cache.put(semantic_cache_key(cached_song, artist), self.result)
+            self.assertIsNone(self.cache.get(semantic_cache_key(queried_song, artist)))
+    
+    def test_returns_copies(self):
+        """Test that modifying a returned result does not change the cache."""
+        key = semantic_cache_key("Lemon", "Kenshi Yonezu")
+        self.cache.put(key, self.result)
+        self.cache.get(key)["vocabulary"].clear()
+        self.assertEqual(len(self.cache.get(key)["vocabulary"]), 1)
+    
+    def test_max_entries(self):
+        """Test that the oldest entry is dropped when the cache is full."""
+        cache = SemanticCache(max_entries=2)
+        for song in ("first song", "second song", "third song"):
+            cache.put(semantic_cache_key(song), self.result)
+        self.assertIsNone(cache.get(semantic_cache_key("first song")))
+        self.assertIsNotNone(cache.get(semantic_cache_key("third song")))
+    
+    def test_save_and_load(self):
+        """Test that a saved cache is loaded by a new instance."""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        path = os.path.join(test_dir, "semantic_cache.json")
+        
+        cache = SemanticCache(path)
+        cache.put(semantic_cache_key("Lemon", "Kenshi Yonezu"), self.result)
+        cache.save()
+        
+        cached = SemanticCache(path).get(semantic_cache_key("Lemon", "Kenshi Yonezu"))
+        self.assertEqual(cached["vocabulary"], self.result["vocabulary"])
+
+    def test_save_merges_with_other_processes(self):
+        """Test that saving keeps the entries another process saved to the same file."""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        path = os.path.join(test_dir, "semantic_cache.json")
+        
+        first = SemanticCache(path)
+        second = SemanticCache(path)
+        first.put(semantic_cache_key("Lemon", "Kenshi Yonezu"), self.result)
+        second.put(semantic_cache_key("Pretender", "Official HIGE DANdism"), self.result)
+        first.save()
+        second.save()
+        
+        loaded = SemanticCache(path)
+        self.assertIsNotNone(loaded.get(semantic_cache_key("Lemon", "Kenshi Yonezu")))
+        self.assertIsNotNone(loaded.get(semantic_cache_key("Pretender", "Official HIGE DANdism")))
+        self.assertEqual(sorted(os.listdir(test_dir)), ["semantic_cache.json", "semantic_cache.json.lock"])
+
+if __name__ == '__main__':
+    unittest.main()